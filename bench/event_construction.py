@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -
+
+import timeit
+
+import bernhard
+
+PARAMS = {
+    'host': 'myhost.foobar.com',
+    'service': 'myservice',
+    'state': 'ok',
+    'metric': 12.5,
+    'time': 1400000000,
+    'ttl': 60.0,
+    'tags': ['a', 'b'],
+    'attributes': {'sky': 'sunny', 'sea': 'agitated'},
+}
+
+
+def bench(name, stmt, number=20000, repeat=5):
+    best = min(timeit.repeat(stmt, number=number, repeat=repeat))
+    print("%-32s %8.2f us/event" % (name, best / number * 1e6))
+
+
+def main():
+    bench("Event(params=...)",
+          lambda: bernhard.Event(params=PARAMS))
+    bench("Message(events=[Event(...)])",
+          lambda: bernhard.Message(events=[bernhard.Event(params=PARAMS)]))
+    bench("_build_message([...])",
+          lambda: bernhard._build_message([PARAMS]))
+    static = dict((k, v) for k, v in PARAMS.items()
+                  if k not in ('metric', 'time'))
+    template = bernhard.EventTemplate(static)
+    bench("Message(...).raw",
+          lambda: bernhard._build_message([PARAMS]).raw)
+    bench("EventTemplate.encode(...)",
+          lambda: template.encode(metric=12.5, time=1400000000))
+    event = bernhard.Event(params=PARAMS)
+    bench("Event attribute read", lambda: event.service)
+
+
+if __name__ == '__main__':
+    main()
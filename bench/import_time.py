@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -
+
+# Measures how long a fresh interpreter takes to import bernhard, and to
+# import it and encode an event, with and without loading protobuf. Each
+# case runs in a new process; the best of --runs is reported, minus the
+# time for an interpreter that imports nothing.
+#
+#   PYTHONPATH=. python bench/import_time.py
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+CASES = [
+    ('baseline', 'pass'),
+    ('import', 'import bernhard'),
+    ('wire encode', 'import bernhard\n'
+                    'from bernhard import wire\n'
+                    'wire.encode_message([{"host": "h", "metric": 1}])\n'
+                    'assert "bernhard.proto_pb2" not in sys.modules'),
+    ('protobuf encode', 'import bernhard\n'
+                        'bernhard.Event(params={"host": "h", "metric": 1})'),
+]
+
+
+def best_time(code, runs):
+    best = None
+    for i in range(runs):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', 'import sys\n' + code],
+                              env=os.environ)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    # Make sure the bytecode exists, so the first run is not an outlier.
+    best_time('import bernhard', 1)
+    baseline = None
+    for name, code in CASES:
+        elapsed = best_time(code, args.runs)
+        if baseline is None:
+            baseline = elapsed
+            print('%-16s %7.1f ms' % (name, elapsed * 1000))
+        else:
+            print('%-16s %7.1f ms' % (name, (elapsed - baseline) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -
+
+# Measures throughput, send latency and memory for the clients and transports
+# against an in-process FakeRiemannServer. Run from the repository root:
+#
+#   PYTHONPATH=. python bench/transports.py --events 20000 --latency 0.0005
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import bernhard
+from bernhard.testing import FakeRiemannServer
+
+EVENT = {
+    'host': 'myhost.foobar.com',
+    'service': 'bench',
+    'metric': 1.5,
+    'tags': ['bench'],
+    'attributes': {'sky': 'sunny'},
+}
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def make_certificate(directory):
+    certfile = os.path.join(directory, 'cert.pem')
+    keyfile = os.path.join(directory, 'key.pem')
+    subprocess.check_call(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+         '-keyout', keyfile, '-out', certfile, '-days', '1',
+         '-subj', '/CN=localhost'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certfile, keyfile
+
+
+def run_sync(send, events, batch):
+    latencies = []
+    for i in range(0, events, batch):
+        start = time.perf_counter()
+        send(*[EVENT] * batch)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def measure(name, setup, events, batch):
+    try:
+        send, finish = setup()
+        run_sync(send, min(events, 100 * batch), batch)
+
+        start = time.perf_counter()
+        latencies = run_sync(send, events, batch)
+        finish()
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        run_sync(send, min(events, 1000 * batch), batch)
+        finish()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    except Exception as e:
+        print("%-12s failed: %s" % (name, e))
+        return
+    print("%-12s %10.0f %10.1f %10.1f %10.1f" % (
+        name, events / elapsed,
+        percentile(latencies, 0.5) * 1e6, percentile(latencies, 0.99) * 1e6,
+        peak / 1024.0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--batch', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds the fake server waits before each ack")
+    parser.add_argument('--only', default=None,
+                        help="comma-separated list of benchmarks to run")
+    args = parser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        certfile, keyfile = make_certificate(tmpdir)
+    except (OSError, subprocess.CalledProcessError):
+        certfile = keyfile = None
+
+    servers = {
+        'tcp': FakeRiemannServer(latency=args.latency, store=False),
+        'udp': FakeRiemannServer(protocol='udp', store=False),
+        'unix': FakeRiemannServer(protocol='unix', latency=args.latency,
+                                  store=False),
+        'unix-dgram': FakeRiemannServer(protocol='unix-dgram', store=False),
+    }
+    if certfile:
+        servers['tls'] = FakeRiemannServer(protocol='tls',
+                                           latency=args.latency, store=False,
+                                           certfile=certfile, keyfile=keyfile)
+    for server in servers.values():
+        server.start()
+    tcp, udp, tls = servers['tcp'], servers['udp'], servers.get('tls')
+    unix, unix_dgram = servers['unix'], servers['unix-dgram']
+
+    def client(c):
+        return lambda: (c.send, lambda: None)
+
+    def ssl_client():
+        if tls is None:
+            raise RuntimeError("openssl is not available")
+        c = bernhard.SSLClient(port=tls.port, ca_certs=certfile)
+        return c.send, lambda: None
+
+    def pipelined():
+        c = bernhard.PipelinedClient(port=tcp.port)
+        pending = []
+
+        def finish():
+            for p in pending:
+                p.result()
+            del pending[:]
+        return (lambda *events: pending.append(c.send_async(*events)),
+                finish)
+
+    def batching():
+        from bernhard.batching import BatchingClient
+        c = BatchingClient(bernhard.Client(port=tcp.port), max_buffer=10 ** 6)
+        return c.send, c.flush
+
+    def asyncio_client():
+        import asyncio
+        from bernhard.aio import AsyncClient
+        loop = asyncio.new_event_loop()
+        c = AsyncClient(port=tcp.port)
+        return (lambda *events: loop.run_until_complete(c.send(*events)),
+                lambda: None)
+
+    benchmarks = [
+        ('tcp', client(bernhard.Client(port=tcp.port))),
+        ('tls', ssl_client),
+        ('udp', client(bernhard.UDPClient(port=udp.port))),
+        ('unix', client(bernhard.Client(unix.path,
+                                        transport=bernhard.UnixTransport))),
+        ('unix-dgram', client(bernhard.UDPClient(
+            unix_dgram.path, transport=bernhard.UnixDatagramTransport))),
+        ('pipelined', pipelined),
+        ('batching', batching),
+        ('asyncio', asyncio_client),
+    ]
+    only = args.only.split(',') if args.only else None
+
+    print("%d events, %d per send, %.1f ms server latency, Python %s" % (
+        args.events, args.batch, args.latency * 1e3, sys.version.split()[0]))
+    print("%-12s %10s %10s %10s %10s" % (
+        'client', 'events/s', 'p50 us', 'p99 us', 'peak KiB'))
+    try:
+        for name, setup in benchmarks:
+            if only is None or name in only:
+                measure(name, setup, args.events, args.batch)
+    finally:
+        for server in servers.values():
+            server.stop()
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
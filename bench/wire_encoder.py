@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -
+
+# Checks that bernhard.wire produces the same bytes as protobuf, then times
+# both. Run it once per protobuf backend, for example:
+#
+#   PYTHONPATH=. PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=python python bench/wire_encoder.py
+#   PYTHONPATH=. PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=upb python bench/wire_encoder.py
+
+import random
+import timeit
+
+from google.protobuf.internal import api_implementation
+
+import bernhard
+from bernhard import wire
+
+
+def random_event(rng):
+    params = {'host': 'host-%d' % rng.randint(0, 1000),
+              'service': u'svc \u00e9 %d' % rng.randint(0, 50)}
+    if rng.random() < 0.5:
+        params['metric'] = rng.uniform(-1e6, 1e6)
+    if rng.random() < 0.3:
+        params['metric_d'] = rng.uniform(-1e12, 1e12)
+    if rng.random() < 0.3:
+        params['metric_sint64'] = rng.randint(-2 ** 63, 2 ** 63 - 1)
+    if rng.random() < 0.7:
+        params['time'] = rng.randint(-2 ** 40, 2 ** 40)
+    if rng.random() < 0.5:
+        params['state'] = rng.choice(['ok', 'warning', 'critical', ''])
+    if rng.random() < 0.3:
+        params['description'] = 'x' * rng.randint(0, 300)
+    if rng.random() < 0.5:
+        params['ttl'] = rng.uniform(0, 3600)
+    if rng.random() < 0.5:
+        params['tags'] = ['tag%d' % i for i in range(rng.randint(0, 5))]
+    if rng.random() < 0.5:
+        params['attributes'] = dict(('k%d' % i, rng.choice([i, 'v', b'b', 1.5]))
+                                    for i in range(rng.randint(0, 4)))
+    return params
+
+
+def verify(count=20000):
+    rng = random.Random(0)
+    for i in range(count):
+        events = [random_event(rng) for j in range(rng.randint(1, 4))]
+        expected = bernhard._build_message(events).raw
+        actual = wire.encode_message(events)
+        if expected != actual:
+            raise AssertionError("Mismatch for %r:\n%r\n%r" % (events, expected, actual))
+    for q in ['true', u'service = "\u00e9"']:
+        assert bernhard.Message(query=q).raw == wire.encode_message(query=q)
+    print("%d random messages encode identically" % count)
+
+
+def bench(name, stmt, number=2000, repeat=5):
+    best = min(timeit.repeat(stmt, number=number, repeat=repeat))
+    print("%-28s %8.2f us/event" % (name, best / number / 100 * 1e6))
+
+
+def main():
+    print("protobuf backend: %s" % api_implementation.Type())
+    verify()
+    events = [{'host': 'myhost.foobar.com', 'service': 'disk %d' % i,
+               'metric': i * 0.5, 'time': 1400000000, 'ttl': 60.0,
+               'tags': ['bench'], 'attributes': {'dc': 'east'}}
+              for i in range(100)]
+    rows = [(e['host'], e['service'], e['metric'], e['time']) for e in events]
+    bench("protobuf", lambda: bernhard._build_message(events).raw)
+    bench("wire.encode_message", lambda: wire.encode_message(events))
+    bench("wire.encode_rows", lambda: wire.frame_events(
+        wire.encode_rows(('host', 'service', 'metric', 'time'), rows)))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,21 +3,62 @@
 import logging
 log = logging.getLogger(__name__)
 
-import pkg_resources
+import collections
+import errno
+import importlib
+import io
+import os
+import select
 import socket
 import ssl
 import struct
 import sys
+import threading
+import time
+import weakref
+
+from bernhard import wire
+
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
+
+try:
+    import selectors
+except ImportError:
+    selectors = None
 
 try:
-    PROTOBUF_VERSION = pkg_resources.get_distribution('protobuf').version
-except pkg_resources.DistributionNotFound:
+    import google.protobuf
+    PROTOBUF_VERSION = getattr(google.protobuf, '__version__', '2')
+    HAS_PROTOBUF = True
+except ImportError:
     PROTOBUF_VERSION = 'unknown'
+    HAS_PROTOBUF = False
+
 
-if PROTOBUF_VERSION.startswith('3'):
-    from . import proto_pb2 as pb
-else:
-    from . import pb
+def _import_protobuf():
+    if not HAS_PROTOBUF:
+        raise ImportError("protobuf is not installed; without it bernhard can "
+                          "only send events encoded by bernhard.wire")
+    if PROTOBUF_VERSION.startswith('2'):
+        return importlib.import_module('bernhard.pb')
+    return importlib.import_module('bernhard.proto_pb2')
+
+
+class _LazyProtobuf(object):
+    # Stands in for the generated protobuf module, which is imported on first
+    # use so that importing bernhard stays cheap for scripts that only send.
+    # Once loaded, the module's names are copied here and looked up directly.
+    def __getattr__(self, name):
+        module = _import_protobuf()
+        self.__dict__.update((k, v) for k, v in vars(module).items()
+                             if not k.startswith('__'))
+        return getattr(module, name)
+
+
+pb = _LazyProtobuf()
 
 
 string_type = str
@@ -32,85 +73,658 @@ class TransportError(Exception):
         return self.msg
 
 
-class TCPTransport(object):
-    def __init__(self, host, port):
-        for res in socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM):
-            af, socktype, proto, canonname, sa = res
-            try:
-                log.debug("Creating socket with %s %s %s", af, socktype, proto)
-                self.sock = socket.socket(af, socktype, proto)
-                self.sock.settimeout(15.0)
-            except socket.error as e:
-                log.exception("Exception creating TCP socket: %s", e)
-                self.sock = None
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class Instrumentation(object):
+    # Counters and latency histograms for clients and transports, exported
+    # with snapshot(). Instrumented code only calls count() and observe(),
+    # so a subclass can forward them elsewhere. Updates take no locks and do
+    # not log, so they are safe to make from signal handlers and cheap on the
+    # hot path; when no instrumentation is set, transports skip timing
+    # entirely.
+    #
+    # Histogram buckets are powers of two from 1us up to ~16s.
+    BOUNDS = tuple(2.0 ** i / 1e6 for i in range(25))
+
+    def __init__(self):
+        self.counters = collections.defaultdict(int)
+        self.histograms = {}
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = [0] * (len(self.BOUNDS) + 2)
+        i = 0
+        for bound in self.BOUNDS:
+            if seconds <= bound:
+                break
+            i += 1
+        histogram[i] += 1
+        histogram[-1] += seconds
+
+    def snapshot(self):
+        histograms = {}
+        for name, histogram in list(self.histograms.items()):
+            buckets = histogram[:-1]
+            histograms[name] = {
+                'count': sum(buckets),
+                'sum': histogram[-1],
+                'buckets': dict((bound, n) for bound, n in
+                                zip(self.BOUNDS + (float('inf'),), buckets)
+                                if n),
+            }
+        return {'counters': dict(self.counters), 'histograms': histograms}
+
+
+class Resolver(object):
+    # Caches getaddrinfo results for `ttl` seconds, so reconnects do not
+    # resolve the host again. Addresses are returned with the address
+    # families interleaved, as RFC 8305 recommends for connection attempts.
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port, socktype=socket.SOCK_STREAM):
+        key = (host, port, socktype)
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        try:
+            addresses = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socktype)
+        except socket.error as e:
+            raise TransportError("Could not resolve %s: %s" % (host, e))
+        addresses = interleave(addresses)
+        with self._lock:
+            self._cache[key] = (now + self.ttl, addresses)
+        return addresses
+
+    def invalidate(self, host, port, socktype=socket.SOCK_STREAM):
+        with self._lock:
+            self._cache.pop((host, port, socktype), None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+default_resolver = Resolver()
+
+
+def interleave(addresses):
+    # Alternates address families, starting with the family of the first
+    # address returned.
+    families = collections.OrderedDict()
+    for address in addresses:
+        families.setdefault(address[0], collections.deque()).append(address)
+    queues = list(families.values())
+    result = []
+    while queues:
+        for queue in list(queues):
+            result.append(queue.popleft())
+            if not queue:
+                queues.remove(queue)
+    return result
+
+
+def wait_ready(socks, timeout, write=False):
+    # Returns the sockets that are readable, or writable if `write` is set,
+    # within `timeout` seconds. select() cannot watch file descriptors of
+    # 1024 and above, which forking servers often reach, so a selector
+    # (epoll, kqueue or poll) is used where the selectors module exists.
+    if selectors is None:
+        if write:
+            return select.select([], socks, [], timeout)[1]
+        return select.select(socks, [], [], timeout)[0]
+    selector = selectors.DefaultSelector()
+    try:
+        event = selectors.EVENT_WRITE if write else selectors.EVENT_READ
+        for sock in socks:
+            selector.register(sock, event)
+        return [key.fileobj for key, mask in selector.select(timeout)]
+    finally:
+        selector.close()
+
+
+_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY,
+                getattr(errno, 'WSAEWOULDBLOCK', errno.EWOULDBLOCK))
+
+
+def connect_parallel(addresses, timeout=15.0, delay=0.25):
+    # Happy eyeballs (RFC 8305): starts a connection attempt to the next
+    # address every `delay` seconds, or as soon as an attempt fails, and
+    # keeps the first socket to connect. Returns a non-blocking socket.
+    deadline = time.time() + timeout
+    pending = collections.deque(addresses)
+    attempts = {}
+    winner = None
+    error = None
+    next_attempt = 0
+    try:
+        while winner is None and (pending or attempts):
+            now = time.time()
+            if now >= deadline:
+                error = socket.timeout("timed out")
+                break
+            if pending and (not attempts or now >= next_attempt):
+                af, socktype, proto, canonname, sa = pending.popleft()
+                try:
+                    sock = socket.socket(af, socktype, proto)
+                except socket.error as e:
+                    error = e
+                    continue
+                sock.setblocking(False)
+                err = sock.connect_ex(sa)
+                if err == 0:
+                    winner = sock
+                    break
+                if err not in _IN_PROGRESS:
+                    error = socket.error(err, os.strerror(err))
+                    sock.close()
+                    continue
+                attempts[sock] = sa
+                next_attempt = now + delay
                 continue
+            wait = deadline - now
+            if pending:
+                wait = min(wait, max(next_attempt - now, 0))
             try:
-                self.sock.connect(sa)
-            except socket.error as e:
-                log.exception("Exception connecting to TCP socket: %s", e)
-                self.sock.close()
-                self.sock = None
-                continue
-            break
-        if self.sock is None:
+                writable = wait_ready(list(attempts), wait, write=True)
+            except (select.error, socket.error, ValueError) as e:
+                # Raised as a socket.error, which transports report as a
+                # TransportError.
+                error = socket.error(str(e))
+                break
+            for sock in writable:
+                sa = attempts.pop(sock)
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0:
+                    winner = sock
+                    break
+                log.debug("Connecting to %s failed: %s", sa, os.strerror(err))
+                error = socket.error(err, os.strerror(err))
+                sock.close()
+                next_attempt = 0
+    finally:
+        for sock in attempts:
+            if sock is not winner:
+                sock.close()
+    if winner is None:
+        raise error or socket.error("No addresses to connect to")
+    return winner
+
+
+class TCPTransport(object):
+    # Largest response frame accepted from Riemann, so that an unexpectedly
+    # large query result cannot exhaust memory.
+    max_frame_size = 64 * 1024 * 1024
+    # Size of the reusable receive buffer kept between frames.
+    buffer_size = 64 * 1024
+    instrumentation = None
+    # Seconds to wait for a connection, and for each read or write once
+    # connected.
+    connect_timeout = 15.0
+    read_timeout = 15.0
+    # Seconds before the connection attempt to the next address starts.
+    happy_eyeballs_delay = 0.25
+
+    def __init__(self, host, port, connect_timeout=None, read_timeout=None,
+                 resolver=None):
+        self.buffer = None
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
+        if read_timeout is not None:
+            self.read_timeout = read_timeout
+        if resolver is None:
+            resolver = default_resolver
+        addresses = resolver.resolve(host, port, socket.SOCK_STREAM)
+        try:
+            self.sock = connect_parallel(addresses, self.connect_timeout,
+                                         self.happy_eyeballs_delay)
+        except socket.error as e:
+            log.warning("Exception connecting to %s:%s over TCP: %s", host, port, e)
+            resolver.invalidate(host, port, socket.SOCK_STREAM)
             raise TransportError("Could not open TCP socket.")
+        self.sock.settimeout(self.read_timeout)
 
     def close(self):
         self.sock.close()
 
     def read_exactly(self, sock, size):
-        buffer = bytes()  # empty bytes sequence for Python 2.6+
-        while len(buffer) < size:
-            data = sock.recv(size - len(buffer))
-            if not data:
-                log.debug("Expected to read %s bytes, but read %s bytes", size, len(buffer))
+        buffer = bytearray(size)
+        read = self.read_into(sock, memoryview(buffer))
+        if read < size:
+            log.debug("Expected to read %s bytes, but read %s bytes", size, read)
+            del buffer[read:]
+        return bytes(buffer)
+
+    def read_into(self, sock, view):
+        read = 0
+        size = len(view)
+        while read < size:
+            n = sock.recv_into(view[read:])
+            if not n:
                 break
-            buffer += data
-        return buffer
+            read += n
+        return read
+
+    def read_frame(self, sock):
+        # Responses are received into a buffer that is reused across frames,
+        # and the returned memoryview is only valid until the next read, so
+        # it must not leave the transport; write() returns a copy.
+        # Growing the buffer allocates a new one rather than resizing, since
+        # a caller may still hold a view of the old one.
+        if self.buffer is None or len(self.buffer) > self.buffer_size:
+            self.buffer = bytearray(self.buffer_size)
+        view = memoryview(self.buffer)
+        inst = self.instrumentation
+        if inst is not None:
+            start = _clock()
+        if self.read_into(sock, view[:4]) < 4:
+            raise TransportError("Connection closed by Riemann.")
+        rxlen = struct.unpack_from('!I', self.buffer)[0]
+        if inst is not None:
+            header = _clock()
+            inst.observe('read_header', header - start)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Header Length Is: %d", rxlen)
+        if rxlen > self.max_frame_size:
+            raise TransportError("Response of %d bytes exceeds max_frame_size "
+                                 "of %d bytes." % (rxlen, self.max_frame_size))
+        if rxlen > len(self.buffer):
+            self.buffer = bytearray(max(rxlen, 2 * len(self.buffer)))
+            view = memoryview(self.buffer)
+        if self.read_into(sock, view[:rxlen]) < rxlen:
+            raise TransportError("Connection closed by Riemann.")
+        if inst is not None:
+            inst.observe('read_body', _clock() - header)
+            inst.count('frames_received')
+            inst.count('bytes_received', 4 + rxlen)
+        return view[:rxlen]
 
     def write(self, message):
+        inst = self.instrumentation
+        debug = log.isEnabledFor(logging.DEBUG)
         try:
             # Tx length header and message
-            log.debug("Sending event to Riemann")
+            if debug:
+                log.debug("Sending event to Riemann")
+            if inst is not None:
+                start = _clock()
             self.sock.sendall(struct.pack('!I', len(message)) + message)
+            if inst is not None:
+                inst.observe('send', _clock() - start)
+                inst.count('frames_sent')
+                inst.count('bytes_sent', 4 + len(message))
 
-            # Rx length header
-            log.debug("Reading Riemann Response Length Header")
-            response = self.read_exactly(self.sock, 4)
-            rxlen = struct.unpack('!I', response)[0]
-            log.debug("Header Length Is: %d", rxlen)
-
-            # Rx entire response
-            log.debug("Reading Riemann Response")
-            response = self.read_exactly(self.sock, rxlen)
-
-            return response
+            # Rx length header and entire response. The copy outlives the
+            # receive buffer, which the next read on this connection reuses,
+            # possibly from another thread once a pool has it back.
+            if debug:
+                log.debug("Reading Riemann Response")
+            return self.read_frame(self.sock).tobytes()
         except (socket.error, struct.error) as e:
             log.exception("Exception sending event to Riemann over TCP socket: %s", e)
             raise TransportError(str(e))
 
+    def stream(self, message):
+        # Like write, but decodes the response while it is being received
+        # and yields its top-level (field number, value) pairs, so that a
+        # large query result is never held in memory at once. The response
+        # must be consumed completely before the transport is used again.
+        try:
+            self.sock.sendall(struct.pack('!I', len(message)) + message)
+            header = bytearray(4)
+            if self.read_into(self.sock, memoryview(header)) < 4:
+                raise TransportError("Connection closed by Riemann.")
+            rxlen = struct.unpack_from('!I', header)[0]
+            reader = FrameReader(self.sock, rxlen)
+            for field in wire.iter_fields(reader.read, rxlen):
+                yield field
+        except (socket.error, struct.error, ValueError) as e:
+            log.exception("Exception streaming response from Riemann over TCP socket: %s", e)
+            raise TransportError(str(e))
+
+
+class FrameReader(object):
+    # Reads one response frame from a socket in small pieces, through a
+    # reusable buffer, without ever reading past the end of the frame.
+    def __init__(self, sock, length, buffer_size=64 * 1024):
+        self.sock = sock
+        self.remaining = length
+        self.buffer = bytearray(min(buffer_size, length) or 1)
+        self.view = memoryview(self.buffer)
+        self.start = self.end = 0
+
+    def _fill(self):
+        size = min(len(self.buffer), self.remaining)
+        n = self.sock.recv_into(self.view[:size]) if size else 0
+        if not n:
+            raise TransportError("Connection closed by Riemann.")
+        self.remaining -= n
+        self.start, self.end = 0, n
+
+    def read(self, size):
+        if self.end - self.start >= size:
+            data = self.view[self.start:self.start + size].tobytes()
+            self.start += size
+            return data
+        parts = []
+        while size:
+            if self.start == self.end:
+                self._fill()
+            n = min(size, self.end - self.start)
+            parts.append(self.view[self.start:self.start + n].tobytes())
+            self.start += n
+            size -= n
+        return b''.join(parts)
+
+
+def create_ssl_context(keyfile=None, certfile=None, ca_certs=None,
+                       check_hostname=None):
+    # Requires TLS 1.2 or newer and a certificate signed by ca_certs, or by
+    # one of the system CAs. Any publicly trusted certificate is signed by a
+    # system CA, so without ca_certs the host name is always checked. With a
+    # private CA it is not checked unless check_hostname is set, as Riemann
+    # is commonly reached by IP address.
+    if check_hostname is None:
+        check_hostname = not ca_certs
+    elif not check_hostname and not ca_certs:
+        raise ValueError("check_hostname may only be disabled for a private "
+                         "CA given in ca_certs")
+    context = ssl.SSLContext(getattr(ssl, 'PROTOCOL_TLS_CLIENT',
+                                     ssl.PROTOCOL_SSLv23))
+    context.verify_mode = ssl.CERT_REQUIRED
+    context.check_hostname = check_hostname
+    if hasattr(context, 'minimum_version'):
+        context.minimum_version = ssl.TLSVersion.TLSv1_2
+    else:
+        context.options |= (ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 |
+                            ssl.OP_NO_TLSv1 | ssl.OP_NO_TLSv1_1)
+    if ca_certs:
+        context.load_verify_locations(ca_certs)
+    else:
+        context.load_default_certs()
+    if certfile:
+        context.load_cert_chain(certfile, keyfile)
+    return context
+
 
 class SSLTransport(TCPTransport):
-    def __init__(self, host, port, keyfile=None, certfile=None, ca_certs=None):
+    def __init__(self, host, port, keyfile=None, certfile=None, ca_certs=None,
+                 context=None, session=None, connect_timeout=None,
+                 read_timeout=None, resolver=None, check_hostname=None):
         log.debug("Using SSL Transport")
 
-        TCPTransport.__init__(self, host, port)
+        if context is None:
+            context = create_ssl_context(keyfile, certfile, ca_certs,
+                                         check_hostname)
+
+        TCPTransport.__init__(self, host, port, connect_timeout, read_timeout,
+                              resolver)
+
+        # The handshake is part of connecting.
+        self.sock.settimeout(self.connect_timeout)
+        kwargs = {}
+        if session is not None:
+            kwargs['session'] = session
+        start = _clock()
+        try:
+            self.sock = context.wrap_socket(self.sock, server_hostname=host,
+                                            **kwargs)
+        except (ssl.SSLError, socket.error) as e:
+            log.exception("Exception during TLS handshake: %s", e)
+            self.sock.close()
+            raise TransportError(str(e))
+        self.handshake_time = _clock() - start
+        self.sock.settimeout(self.read_timeout)
+
+    @property
+    def session(self):
+        return getattr(self.sock, 'session', None)
+
+    @property
+    def session_reused(self):
+        return getattr(self.sock, 'session_reused', False)
+
+
+class UnixTransport(TCPTransport):
+    # The TCP framing over a Unix domain stream socket at `path`, such as a
+    # Riemann relay on the same host. This avoids the loopback TCP stack.
+    def __init__(self, path, port=None, connect_timeout=None,
+                 read_timeout=None):
+        log.debug("Using Unix stream transport")
+
+        self.buffer = None
+        self.path = path
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
+        if read_timeout is not None:
+            self.read_timeout = read_timeout
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.connect_timeout)
+        try:
+            self.sock.connect(path)
+        except socket.error as e:
+            log.warning("Exception connecting to %s: %s", path, e)
+            self.sock.close()
+            raise TransportError("Could not connect to %s: %s" % (path, e))
+        self.sock.settimeout(self.read_timeout)
+
+
+class PendingResponse(object):
+    def __init__(self, callback=None, decode=None):
+        self.callback = callback
+        self.decode = decode
+        self.raw = None
+        self.error = None
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TransportError("Timed out waiting for Riemann response.")
+        if self.error is not None:
+            raise self.error
+        if self.decode is not None:
+            return self.decode(self.raw)
+        return self.raw
+
+    def _resolve(self, raw=None, error=None):
+        self.raw = raw
+        self.error = error
+        if self.callback is not None:
+            try:
+                self.callback(self)
+            except Exception as e:
+                log.exception("Exception in response callback: %s", e)
+        self._done.set()
+
 
-        self.sock = ssl.wrap_socket(self.sock,
-                                    keyfile=keyfile,
-                                    certfile=certfile,
-                                    cert_reqs=ssl.CERT_REQUIRED,
-                                    ssl_version=ssl.PROTOCOL_TLSv1,
-                                    ca_certs=ca_certs)
+class PipelinedTCPTransport(TCPTransport):
+    # Frames are written back-to-back without waiting for their acks; a
+    # reader thread matches acks to callers in FIFO order, which is the order
+    # Riemann answers them in.
+    def __init__(self, host, port, max_in_flight=128, connect_timeout=None,
+                 read_timeout=None, resolver=None):
+        TCPTransport.__init__(self, host, port, connect_timeout, read_timeout,
+                              resolver)
+
+        self.max_in_flight = max_in_flight
+        self.error = None
+        self._closed = False
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._send_lock = threading.Lock()
+        self._cond = threading.Condition(threading.Lock())
+        self._pending = collections.deque()
+        # The frame submit() is writing, which _fail() leaves to submit().
+        self._writing = None
+
+        self._reader = threading.Thread(target=self._read_loop,
+                                        name='bernhard-pipeline-reader')
+        self._reader.daemon = True
+        self._reader.start()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._fail(TransportError("Transport closed."))
+        # Otherwise the reader thread closes the socket as it exits.
+        if not self._reader.is_alive():
+            self._release()
+
+    def _release(self):
+        # Closes the socket once no write is in progress. A descriptor closed
+        # under a thread still using it may be reused by a new socket, which
+        # that thread would then write to or read from.
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        with self._send_lock:
+            self.sock.close()
+
+    def in_flight(self):
+        return len(self._pending)
+
+    def submit(self, message, callback=None, decode=None):
+        if self.error is not None:
+            raise self.error
+        self._slots.acquire()
+        pending = PendingResponse(callback, decode)
+        with self._send_lock:
+            if self.error is not None:
+                self._slots.release()
+                raise self.error
+            with self._cond:
+                self._pending.append(pending)
+                self._writing = pending
+                self._cond.notify()
+            inst = self.instrumentation
+            error = None
+            try:
+                if inst is not None:
+                    start = _clock()
+                self.sock.sendall(struct.pack('!I', len(message)) + message)
+                if inst is not None:
+                    inst.observe('send', _clock() - start)
+                    inst.count('frames_sent')
+                    inst.count('bytes_sent', 4 + len(message))
+            except socket.error as e:
+                if not self._closed:
+                    log.exception("Exception sending event to Riemann over TCP socket: %s", e)
+                error = TransportError(str(e))
+            with self._cond:
+                self._writing = None
+                if error is not None:
+                    # The caller learns about this frame from the exception,
+                    # so its callback is not invoked.
+                    if pending in self._pending:
+                        self._pending.remove(pending)
+                    failed = False
+                else:
+                    # If the transport failed while the frame was being
+                    # written, its ack will never be read.
+                    failed = self.error is not None and pending in self._pending
+                    if failed:
+                        self._pending.remove(pending)
+        # Callbacks run outside _send_lock, as they may close the transport.
+        if error is not None:
+            self._slots.release()
+            self._fail(error)
+            raise error
+        if failed:
+            self._slots.release()
+            pending._resolve(error=self.error)
+        return pending
+
+    def write(self, message):
+        return self.submit(message).result()
+
+    def _read_loop(self):
+        try:
+            while True:
+                with self._cond:
+                    while (not self._pending and not self._closed and
+                           self.error is None):
+                        self._cond.wait()
+                    if self._closed or self.error is not None:
+                        return
+                # Responses are handed to other threads, so copy them out of
+                # the shared receive buffer.
+                response = self.read_frame(self.sock).tobytes()
+                with self._cond:
+                    # close() or a failed write may have failed every
+                    # pending frame meanwhile.
+                    if self._closed or not self._pending:
+                        return
+                    pending = self._pending.popleft()
+                self._slots.release()
+                pending._resolve(raw=response)
+        except (socket.error, struct.error) as e:
+            if not self._closed:
+                log.exception("Exception reading from Riemann over TCP socket: %s", e)
+            self._fail(TransportError(str(e)))
+        except TransportError as e:
+            self._fail(e)
+        finally:
+            self._release()
+
+    def _fail(self, error):
+        with self._cond:
+            if self.error is None:
+                self.error = error
+            self._cond.notify_all()
+            failed = [pending for pending in self._pending
+                      if pending is not self._writing]
+            self._pending.clear()
+            if self._writing is not None:
+                self._pending.append(self._writing)
+        for pending in failed:
+            self._slots.release()
+            pending._resolve(error=self.error)
+
+    def stream(self, message):
+        # Acks share the socket with other requests' responses, so the
+        # response is read whole by the reader thread and decoded after.
+        raw = self.write(message)
+        reader = io.BytesIO(raw)
+        for field in wire.iter_fields(reader.read, len(raw)):
+            yield field
 
 
 class UDPTransport(object):
-    def __init__(self, host, port):
+    instrumentation = None
+
+    def __init__(self, host, port, connect_timeout=None, read_timeout=None,
+                 resolver=None):
+        # The timeouts are accepted for symmetry with TCPTransport; sending a
+        # datagram does not wait for the server.
         log.debug("Using UDP Transport")
 
+        if resolver is None:
+            resolver = default_resolver
         self.host = None
         self.port = None
-        for res in socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_DGRAM):
+        self.sock = None
+        for res in resolver.resolve(host, port, socket.SOCK_DGRAM):
             af, socktype, proto, canonname, sa = res
             try:
                 self.sock = socket.socket(af, socktype, proto)
@@ -130,11 +744,123 @@ class UDPTransport(object):
     def write(self, message):
         try:
             self.sock.sendto(message, (self.host, self.port))
+            inst = self.instrumentation
+            if inst is not None:
+                inst.count('frames_sent')
+                inst.count('bytes_sent', len(message))
         except socket.error as e:
             log.exception("Exception writing to socket: %s", e)
             raise TransportError(str(e))
 
 
+class UnixDatagramTransport(object):
+    # Sends each Msg as one datagram to a Unix domain socket at `path`, for
+    # a local relay. Unlike UDP, a full receive queue makes the sender wait;
+    # after write_timeout seconds the write fails instead.
+    instrumentation = None
+    write_timeout = 1.0
+
+    def __init__(self, path, port=None, connect_timeout=None,
+                 read_timeout=None):
+        log.debug("Using Unix datagram transport")
+
+        if read_timeout is not None:
+            self.write_timeout = read_timeout
+
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            self.sock.connect(path)
+        except socket.error as e:
+            self.sock.close()
+            raise TransportError("Could not connect to %s: %s" % (path, e))
+        self.sock.settimeout(self.write_timeout)
+
+    def close(self):
+        self.sock.close()
+
+    def write(self, message):
+        try:
+            self.sock.send(message)
+            inst = self.instrumentation
+            if inst is not None:
+                inst.count('frames_sent')
+                inst.count('bytes_sent', len(message))
+        except socket.error as e:
+            log.warning("Exception writing to %s: %s", self.path, e)
+            raise TransportError(str(e))
+
+
+# Field names are looked up on every attribute access. They are listed here,
+# as in proto.proto, rather than read from the descriptors, which would load
+# protobuf at import.
+_EVENT_FIELDS = frozenset(name for name in wire.EVENT_FIELDS if name != 'metric')
+_MSG_FIELDS = frozenset(['ok', 'error', 'states', 'query', 'events'])
+
+
+def _add_attributes(event, attributes):
+    if type(attributes) != dict:
+        raise TypeError("'attributes' parameter must be type 'dict'")
+    for key, val in attributes.items():
+        a = event.attributes.add()
+        a.key = key
+        if isinstance(val, bytes):
+            val = val.decode('utf-8')
+        elif not isinstance(val, string_type):
+            val = string_type(val)
+        a.value = val
+
+
+def _fill_event(event, params):
+    # Writes a params dict straight into a pb.Event. Keys that are not event
+    # fields are ignored, as they would never reach the wire anyway.
+    for name, value in params.items():
+        if name == 'metric':
+            name = 'metric_f'
+        if name == 'tags':
+            event.tags.extend(value)
+        elif name == 'attributes':
+            _add_attributes(event, value)
+        elif name in _EVENT_FIELDS:
+            setattr(event, name, value)
+    return event
+
+
+encode_events = wire.frame_events
+_MSG_EVENTS_FIELD = 6
+
+
+def _pack_events(events, max_size):
+    # Splits pb.Event entries into Msg frames of at most max_size bytes. Each
+    # entry of the repeated `events` field costs a one-byte tag and a varint
+    # length on top of the encoded event. Events that cannot fit in a frame
+    # on their own are returned separately.
+    frames, oversized = [], []
+    frame, frame_size = [], 0
+    for event in events:
+        size = event.ByteSize()
+        size += 1 + wire.varint_size(size)
+        if size > max_size:
+            oversized.append(event)
+            continue
+        if frame and frame_size + size > max_size:
+            frames.append(frame)
+            frame, frame_size = [], 0
+        frame.append(event)
+        frame_size += size
+    if frame:
+        frames.append(frame)
+    return frames, oversized
+
+
+def _build_message(events):
+    message = Message()
+    add = message.message.events.add
+    for params in events:
+        _fill_event(add(), params)
+    return message
+
+
 class Event(object):
     def __init__(self, event=None, params=None):
         if event:
@@ -149,7 +875,7 @@ class Event(object):
     def __getattr__(self, name):
         if name == 'metric':
             name = 'metric_f'
-        if name in set(f.name for f in pb.Event.DESCRIPTOR.fields):
+        if name in _EVENT_FIELDS:
             return getattr(self.event, name)
 
     def __setattr__(self, name, value):
@@ -158,18 +884,8 @@ class Event(object):
         if name == 'tags':
             self.event.tags.extend(value)
         elif name == 'attributes':
-            if type(value) == dict:
-                for key, val in value.items():
-                    a = self.event.attributes.add()
-                    a.key = key
-                    if isinstance(val, bytes):
-                        val = val.decode('utf-8')
-                    elif not isinstance(val, string_type):
-                        val = string_type(val)
-                    a.value = string_type(val)
-            else:
-                raise TypeError("'attributes' parameter must be type 'dict'")
-        elif name in set(f.name for f in pb.Event.DESCRIPTOR.fields):
+            _add_attributes(self.event, value)
+        elif name in _EVENT_FIELDS:
             setattr(self.event, name, value)
         else:
             object.__setattr__(self, name, value)
@@ -178,27 +894,123 @@ class Event(object):
         return str(self.event)
 
 
+class EventTemplate(object):
+    # Fixes the fields shared by many events, such as host, tags, attributes
+    # and ttl, and encodes them once. Events are then produced by encoding
+    # only the fields that vary and appending them to the template's bytes;
+    # protobuf merges the two, with the later value winning for single
+    # fields and repeated fields extended.
+    def __init__(self, params=None, **fields):
+        self.params = dict(params or {}, **fields)
+        self.raw = wire.encode_event(self.params)
+        self._proto = None
+
+    @property
+    def proto(self):
+        if self._proto is None:
+            self._proto = _fill_event(pb.Event(), self.params)
+        return self._proto
+
+    def encode(self, params=None, **fields):
+        if params:
+            fields = dict(params, **fields)
+        if not fields:
+            return self.raw
+        return self.raw + wire.encode_event(fields)
+
+    def event(self, params=None, **fields):
+        return Event(event=pb.Event.FromString(self.encode(params, **fields)))
+
+
+class EventList(Sequence):
+    # A read-only view over a repeated pb.Event field. Event wrappers are
+    # created on first access and then reused.
+    def __init__(self, events):
+        self.events = events
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.events)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        if index < 0:
+            index += len(self)
+        event = self._cache.get(index)
+        if event is None:
+            event = self._cache[index] = Event(event=self.events[index])
+        return event
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return 'EventList(%r)' % list(self)
+
+    def project(self, *fields):
+        # Reads the given fields straight from the protobuf entries into one
+        # tuple per event, without creating any Event wrappers.
+        if not fields:
+            fields = ('host', 'service', 'metric', 'time')
+        names = tuple('metric_f' if f == 'metric' else f for f in fields)
+        for name in names:
+            if name not in _EVENT_FIELDS:
+                raise ValueError("Unknown event field: %s" % name)
+        return [tuple([getattr(e, name) for name in names])
+                for e in self.events]
+
+
 class Message(object):
-    def __init__(self, message=None, events=None, raw=None, query=None):
+    def __init__(self, message=None, events=None, raw=None, query=None,
+                 encoded=None):
+        self._events = None
+        # Pre-encoded Msg bytes to send as-is, see EventTemplate.
+        self._encoded = encoded
+        # Received Msg bytes, parsed when first needed. Acks are only ever
+        # checked for ok and error, which are read without protobuf.
+        self._raw = None
+        self._message = None
         if raw:
-            self.message = pb.Msg().FromString(raw)
+            # Kept until parsed, so it must not be a view of a buffer that
+            # may be reused.
+            if isinstance(raw, (memoryview, bytearray)):
+                raw = bytes(raw) if isinstance(raw, bytearray) else raw.tobytes()
+            self._raw = raw
         elif message:
-            self.message = message
+            self._message = message
         elif events:
-            self.message = pb.Msg()
-            self.message.events.extend([e.event for e in events])
+            self._message = pb.Msg()
+            self._message.events.extend([e.event for e in events])
         elif query:
-            self.message = pb.Msg()
-            self.message.query.string = str(query)
-        else:
-            self.message = pb.Msg()
+            self._message = pb.Msg()
+            self._message.query.string = str(query)
+
+    @property
+    def message(self):
+        if self._message is None:
+            if self._raw is not None:
+                self._message = pb.Msg.FromString(self._raw)
+            else:
+                self._message = pb.Msg()
+        return self._message
+
+    @message.setter
+    def message(self, message):
+        self._message = message
 
     def __getattr__(self, name):
-        if name in set(f.name for f in pb.Msg.DESCRIPTOR.fields):
+        if name in _MSG_FIELDS:
+            if name in ('ok', 'error') and self._message is None:
+                ok, error = wire.decode_ack(self._raw or b'')
+                return ok if name == 'ok' else error
             return getattr(self.message, name)
 
     def __setattr__(self, name, value):
-        if name in set(f.name for f in pb.Msg.DESCRIPTOR.fields):
+        if name in _MSG_FIELDS:
             setattr(self.message, name, value)
         else:
             object.__setattr__(self, name, value)
@@ -206,24 +1018,108 @@ class Message(object):
     # Special-case the `events` field so we get boxed objects
     @property
     def events(self):
-        return [Event(event=e) for e in self.message.events]
+        if self._events is None:
+            self._events = EventList(self.message.events)
+        return self._events
+
+    def is_query(self):
+        return self._message is not None and self._message.HasField('query')
 
     @property
     def raw(self):
+        if self._encoded is not None:
+            return self._encoded
         return self.message.SerializeToString()
 
 
+# Objects holding sockets, locks or threads that must be reset in the child
+# after a fork. Each has an _after_fork() method.
+_fork_handlers = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    for obj in list(_fork_handlers):
+        try:
+            obj._after_fork()
+        except Exception as e:
+            log.exception("Exception resetting %r after fork: %s", obj, e)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _close_socket(connection):
+    # Closes a transport's socket without shutting it down, which would also
+    # end the connection for the other process sharing it.
+    sock = getattr(connection, 'sock', None)
+    if sock is not None:
+        try:
+            sock.close()
+        except Exception:
+            pass
+
+
 class Client(object):
-    def __init__(self, host='127.0.0.1', port=5555, transport=TCPTransport):
+    # A callable turning a sequence of event dicts into encoded Msg bytes,
+    # used by send() instead of building protobuf objects. Set it to
+    # bernhard.wire.encode_message to use the hand-written encoder.
+    encoder = None
+
+    def __init__(self, host='127.0.0.1', port=5555, transport=TCPTransport,
+                 spool=None, instrumentation=None, connect_timeout=None,
+                 read_timeout=None):
         self.host = host
         self.port = port
         self.transport = transport
         self.connection = None
+        self.spool = spool
+        self.instrumentation = instrumentation
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        _fork_handlers.add(self)
+
+    def _after_fork(self):
+        # The connection's socket is shared with the parent process; frames
+        # written by both would interleave. The child reconnects instead.
+        connection, self.connection = self.connection, None
+        _close_socket(connection)
+
+    def _transport_args(self):
+        # Timeouts left as None use the transport's defaults, and are not
+        # passed at all so that transports taking only (host, port) work.
+        args = {}
+        if self.connect_timeout is not None:
+            args['connect_timeout'] = self.connect_timeout
+        if self.read_timeout is not None:
+            args['read_timeout'] = self.read_timeout
+        return args
 
     def connect(self):
-        self.connection = self.transport(self.host, self.port)
+        self.connection = self.transport(self.host, self.port,
+                                         **self._transport_args())
+
+    def _connect(self):
+        inst = self.instrumentation
+        if inst is None:
+            return self.connect()
+        start = _clock()
+        try:
+            self.connect()
+        except TransportError:
+            inst.count('connect_errors')
+            raise
+        inst.observe('connect', _clock() - start)
+        inst.count('connects')
+        handshake_time = getattr(self.connection, 'handshake_time', None)
+        if handshake_time is not None:
+            inst.observe('handshake', handshake_time)
+        self.connection.instrumentation = inst
 
     def disconnect(self):
+        # Nothing to close before the first send or after a failed connect.
+        if self.connection is None:
+            return
         try:
             self.connection.close()
         except Exception as e:
@@ -232,36 +1128,329 @@ class Client(object):
         self.connection = None
 
     def transmit(self, message):
-        for i in range(2):
-            if not self.connection:
-                self.connect()
-            try:
-                raw = self.connection.write(message.raw)
-                return Message(raw=raw)
-            except TransportError:
-                self.disconnect()
+        inst = self.instrumentation
+        if inst is not None:
+            start = _clock()
+            data = message.raw
+            inst.observe('serialize', _clock() - start)
+        else:
+            data = message.raw
+        try:
+            for i in range(2):
+                if i and inst is not None:
+                    inst.count('retries')
+                if not self.connection:
+                    self._connect()
+                try:
+                    raw = self.connection.write(data)
+                except TransportError:
+                    if inst is not None:
+                        inst.count('transport_errors')
+                    self.disconnect()
+                    continue
+                # The response holds its own copy of the ack, so replaying
+                # the spool over the same connection cannot change it.
+                response = Message(raw=raw)
+                if self.spool is not None:
+                    self.replay()
+                return response
+        except TransportError:
+            if self.spool is None:
+                raise
+        if self.spool is not None and not message.is_query():
+            self.spool.append(data)
         return Message()
 
+    def replay(self, limit=None):
+        # Resends frames from the spool once Riemann is reachable again, at
+        # the rate the spool allows, merged into as few messages as it allows.
+        if self.spool is None or not len(self.spool):
+            return 0
+        def write(raw):
+            return Message(raw=self.connection.write(raw)).ok
+        try:
+            return self.spool.replay(write, limit)
+        except TransportError:
+            self.disconnect()
+            return 0
+
     def send(self, *events):
-        message = Message(events=[Event(params=event) for event in events])
+        encoder = self.encoder
+        if encoder is None and not HAS_PROTOBUF:
+            encoder = wire.encode_message
+        if encoder is not None:
+            message = Message(encoded=encoder(events))
+        else:
+            message = _build_message(events)
+        response = self.transmit(message)
+        return response.ok
+
+    def query_iter(self, q):
+        # Yields the events matching q one at a time as they are received,
+        # keeping memory use flat however large the index is. Closing the
+        # generator early drops the connection, since the rest of the
+        # response is still unread.
+        message = Message(query=q)
+        finished = False
+        yielded = False
+        try:
+            for i in range(2):
+                if not self.connection:
+                    self._connect()
+                try:
+                    for number, value in self.connection.stream(message.raw):
+                        if number == _MSG_EVENTS_FIELD:
+                            yielded = True
+                            yield Event(event=pb.Event.FromString(value))
+                    finished = True
+                    return
+                except TransportError:
+                    self.disconnect()
+                    if yielded:
+                        raise
+            raise TransportError("Could not query Riemann.")
+        finally:
+            if not finished and self.connection:
+                self.disconnect()
+
+    def send_encoded(self, *encoded_events):
+        # Sends events already encoded as pb.Event bytes, for example by
+        # EventTemplate.encode.
+        message = Message(encoded=encode_events(encoded_events))
         response = self.transmit(message)
         return response.ok
 
-    def query(self, q):
+    def send_columns(self, max_frame_size=1024 * 1024, **columns):
+        # Sends one event per row of parallel columns, such as NumPy arrays,
+        # with single values shared by every event. Events are encoded
+        # straight from the columns and sent in messages of at most
+        # max_frame_size bytes. Returns whether every message was acked.
+        frames = wire.frame_chunks(wire.encode_columns(columns), max_frame_size)
+        ok = True
+        for frame in frames:
+            response = self.transmit(Message(encoded=frame))
+            ok = ok and bool(response.ok)
+        return ok
+
+    def query(self, q, columnar=False, fields=None):
         message = Message(query=q)
         response = self.transmit(message)
+        if columnar:
+            from bernhard.columnar import to_columns
+            return to_columns(response.message.events, fields)
         return response.events
 
 
 class SSLClient(Client):
+    # The SSLContext is created once per client, and the TLS session of the
+    # last connection is offered again on reconnect so that the server can
+    # resume it instead of doing a full handshake.
     def __init__(self, host='127.0.0.1', port=5554,
-                 keyfile=None, certfile=None, ca_certs=None):
-        Client.__init__(self, host=host, port=port, transport=SSLTransport)
+                 keyfile=None, certfile=None, ca_certs=None, context=None,
+                 connect_timeout=None, read_timeout=None, check_hostname=None):
+        Client.__init__(self, host=host, port=port, transport=SSLTransport,
+                        connect_timeout=connect_timeout,
+                        read_timeout=read_timeout)
 
         self.keyfile = keyfile
         self.certfile = certfile
         self.ca_certs = ca_certs
+        self.check_hostname = check_hostname
+        self.context = context
+        self.session = None
 
     def connect(self):
-        self.connection = self.transport(self.host, self.port, self.keyfile,
-                                         self.certfile, self.ca_certs)
+        if self.context is None:
+            self.context = create_ssl_context(self.keyfile, self.certfile,
+                                              self.ca_certs, self.check_hostname)
+        self.connection = self.transport(self.host, self.port,
+                                         context=self.context,
+                                         session=self.session,
+                                         **self._transport_args())
+
+    def disconnect(self):
+        try:
+            self.session = self.connection.session or self.session
+        except Exception:
+            pass
+        Client.disconnect(self)
+
+
+class PipelinedClient(Client):
+    # send_nowait() returns as soon as a frame is written. Acks are checked
+    # by the transport's reader thread; failed or rejected frames are counted
+    # in `errors`, passed to on_error(message, error), and kept in
+    # `resend_queue` (up to resend_limit messages) for resend().
+    def __init__(self, host='127.0.0.1', port=5555, max_in_flight=128,
+                 on_error=None, resend_limit=0, connect_timeout=None,
+                 read_timeout=None):
+        Client.__init__(self, host=host, port=port,
+                        transport=PipelinedTCPTransport,
+                        connect_timeout=connect_timeout,
+                        read_timeout=read_timeout)
+
+        self.max_in_flight = max_in_flight
+        self.on_error = on_error
+        self.resend_queue = collections.deque(maxlen=resend_limit or None)
+        self.resend_limit = resend_limit
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        self._last = None
+        self._connect_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _after_fork(self):
+        # The reader thread did not survive the fork, and the locks may have
+        # been held by threads that no longer exist.
+        self._connect_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._last = None
+        Client._after_fork(self)
+
+    def connect(self):
+        self.connection = self.transport(self.host, self.port,
+                                         self.max_in_flight,
+                                         **self._transport_args())
+
+    def disconnect(self):
+        with self._connect_lock:
+            Client.disconnect(self)
+
+    def submit(self, message, callback=None, decode=None):
+        for i in range(2):
+            with self._connect_lock:
+                if not self.connection:
+                    self._connect()
+                connection = self.connection
+            try:
+                return connection.submit(message.raw, callback, decode)
+            except TransportError as e:
+                error = e
+                with self._connect_lock:
+                    if self.connection is connection:
+                        Client.disconnect(self)
+        raise error
+
+    def send_async(self, *events):
+        message = _build_message(events)
+        return self.submit(message, decode=lambda raw: Message(raw=raw).ok)
+
+    def send_nowait(self, *events):
+        return self._submit_nowait(_build_message(events))
+
+    def resend(self):
+        count = 0
+        while True:
+            try:
+                message = self.resend_queue.popleft()
+            except IndexError:
+                return count
+            if not self._submit_nowait(message):
+                return count
+            count += 1
+
+    def flush(self, timeout=None):
+        # Acks arrive in order, so once the last frame is answered every
+        # earlier one has been too.
+        last = self._last
+        if last is not None:
+            return last._done.wait(timeout)
+        return True
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'sent': self.sent,
+                'acked': self.acked,
+                'errors': self.errors,
+                'resend_queue': len(self.resend_queue),
+                'in_flight': self.sent - self.acked - self.errors,
+            }
+
+    def _submit_nowait(self, message):
+        def reconcile(pending):
+            if pending.error is not None:
+                self._failed(message, pending.error)
+                return
+            response = Message(raw=pending.raw)
+            if not response.ok:
+                self._failed(message, TransportError(
+                    response.error or "Riemann did not acknowledge the message."))
+                return
+            with self._stats_lock:
+                self.acked += 1
+
+        with self._stats_lock:
+            self.sent += 1
+        try:
+            self._last = self.submit(message, callback=reconcile)
+        except TransportError as e:
+            self._failed(message, e)
+            return False
+        return True
+
+    def _failed(self, message, error):
+        with self._stats_lock:
+            self.errors += 1
+            if self.resend_limit:
+                self.resend_queue.append(message)
+        if self.on_error is not None:
+            try:
+                self.on_error(message, error)
+            except Exception as e:
+                log.exception("Exception in on_error callback: %s", e)
+
+    def transmit(self, message):
+        for i in range(2):
+            try:
+                return Message(raw=self.submit(message).result())
+            except TransportError:
+                pass
+        return Message()
+
+
+class UDPClient(Client):
+    # Riemann reads at most 16384 bytes per datagram by default. Use a value
+    # below the path MTU, such as 1400, to avoid IP fragmentation.
+    def __init__(self, host='127.0.0.1', port=5555, max_datagram_size=16384,
+                 transport=UDPTransport):
+        Client.__init__(self, host=host, port=port, transport=transport)
+
+        self.max_datagram_size = max_datagram_size
+        self.oversized = 0
+
+    def pack(self, *events):
+        message = _build_message(events)
+        frames, oversized = _pack_events(message.message.events,
+                                         self.max_datagram_size)
+        if oversized:
+            self.oversized += len(oversized)
+            log.warning("Dropping %d events larger than max_datagram_size",
+                        len(oversized))
+        datagrams = []
+        for frame in frames:
+            msg = pb.Msg()
+            msg.events.extend(frame)
+            datagrams.append(msg.SerializeToString())
+        return datagrams
+
+    def send(self, *events):
+        # Returns False if any event was dropped as oversized, even when the
+        # rest were written.
+        oversized = self.oversized
+        datagrams = self.pack(*events)
+        if not datagrams:
+            return not events
+        sent = 0
+        for i in range(2):
+            if not self.connection:
+                self._connect()
+            try:
+                while sent < len(datagrams):
+                    self.connection.write(datagrams[sent])
+                    sent += 1
+                return self.oversized == oversized
+            except TransportError:
+                self.disconnect()
+        return False
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -
+
+import logging
+import math
+import threading
+import time
+
+from bernhard import Client, _fork_handlers
+
+log = logging.getLogger(__name__)
+
+
+class LogHistogram(object):
+    # A mergeable quantile sketch in the style of DDSketch. Values fall into
+    # logarithmically sized buckets, so every quantile it reports is within
+    # relative_accuracy of a value that was actually observed.
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _index(self, value):
+        return int(math.ceil(math.log(value) / self.log_gamma))
+
+    def _value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value):
+        self.count += 1
+        if value > 0:
+            index = self._index(value)
+            self.positive[index] = self.positive.get(index, 0) + 1
+        elif value < 0:
+            index = self._index(-value)
+            self.negative[index] = self.negative.get(index, 0) + 1
+        else:
+            self.zeros += 1
+
+    def merge(self, other):
+        for index, n in other.positive.items():
+            self.positive[index] = self.positive.get(index, 0) + n
+        for index, n in other.negative.items():
+            self.negative[index] = self.negative.get(index, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self._value(index)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.positive))
+
+
+class Series(object):
+    def __init__(self, params, relative_accuracy=None):
+        self.params = params
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.histogram = None
+        if relative_accuracy:
+            self.histogram = LogHistogram(relative_accuracy)
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if self.histogram is not None:
+            self.histogram.add(value)
+
+
+class Aggregator(object):
+    # Folds events with a metric into one summary per (host, service, tags)
+    # and sends the summaries every `interval` seconds. The summary's metric
+    # is the statistic named by `metric` (mean, sum, count, min, max or
+    # rate); all of them, plus the requested percentiles, are also sent as
+    # attributes. Other fields are taken from the first event of the
+    # interval. Events without a metric are passed straight to the client.
+    STATISTICS = ('mean', 'sum', 'count', 'min', 'max', 'rate')
+
+    def __init__(self, client=None, interval=10.0, metric='mean',
+                 percentiles=(0.5, 0.95, 0.99), relative_accuracy=0.01,
+                 start=True):
+        if metric not in self.STATISTICS:
+            raise ValueError("Unknown statistic: %s" % metric)
+        self.client = client if client is not None else Client()
+        self.interval = interval
+        self.metric = metric
+        self.percentiles = tuple(percentiles)
+        self.relative_accuracy = relative_accuracy
+
+        self.received = 0
+        self.emitted = 0
+        self.failed = 0
+
+        self._series = {}
+        self._started = time.time()
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._flusher = None
+        if start:
+            self._start_flusher()
+        _fork_handlers.add(self)
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(target=self._flush_loop,
+                                         name='bernhard-aggregator')
+        self._flusher.daemon = True
+        self._flusher.start()
+
+    def _after_fork(self):
+        # The series collected so far are the parent's to send, and the
+        # flusher thread did not survive the fork.
+        self._series = {}
+        self._started = time.time()
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        if self._flusher is not None and not self._stopped.is_set():
+            self._start_flusher()
+
+    def send(self, *events):
+        passthrough = []
+        with self._lock:
+            for params in events:
+                value = params.get('metric')
+                if value is None:
+                    passthrough.append(params)
+                    continue
+                key = (params.get('host'), params.get('service'),
+                       tuple(sorted(params.get('tags') or ())))
+                series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = Series(
+                        params,
+                        self.relative_accuracy if self.percentiles else None)
+                series.add(value)
+                self.received += 1
+        if passthrough:
+            return self.client.send(*passthrough)
+        return True
+
+    def summarize(self, series, elapsed, now):
+        mean = series.sum / series.count
+        stats = {
+            'mean': mean,
+            'sum': series.sum,
+            'count': series.count,
+            'min': series.min,
+            'max': series.max,
+            'rate': series.sum / elapsed if elapsed > 0 else 0.0,
+        }
+        attributes = dict(series.params.get('attributes') or {})
+        for name in self.STATISTICS:
+            attributes[name] = repr(stats[name])
+        if series.histogram is not None:
+            for q in self.percentiles:
+                attributes['p%g' % (q * 100)] = repr(series.histogram.quantile(q))
+        event = dict(series.params)
+        event['metric'] = stats[self.metric]
+        event['time'] = int(now)
+        event['attributes'] = attributes
+        return event
+
+    def flush(self):
+        with self._send_lock:
+            now = time.time()
+            with self._lock:
+                series, self._series = self._series, {}
+                elapsed = now - self._started
+                self._started = now
+            if not series:
+                return True
+            events = [self.summarize(s, elapsed, now) for s in series.values()]
+            try:
+                ok = self.client.send(*events)
+            except Exception as e:
+                log.exception("Exception sending aggregated events: %s", e)
+                ok = False
+            if ok:
+                self.emitted += len(events)
+            else:
+                self.failed += len(events)
+            return ok
+
+    def close(self):
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'series': len(self._series),
+                'received': self.received,
+                'emitted': self.emitted,
+                'failed': self.failed,
+            }
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
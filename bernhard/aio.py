@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -
+
+import asyncio
+import logging
+import socket
+import struct
+
+from bernhard import Message, TransportError, create_ssl_context, _build_message
+from bernhard.columnar import to_columns
+
+log = logging.getLogger(__name__)
+
+
+class AsyncTCPTransport(object):
+    def __init__(self, reader, writer, timeout=15.0):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def connect(cls, host, port, timeout=15.0, ssl_context=None):
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=ssl_context),
+                timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            log.exception("Exception connecting to TCP socket: %s", e)
+            raise TransportError("Could not open TCP socket.")
+        return cls(reader, writer, timeout)
+
+    def close(self):
+        self.writer.close()
+
+    async def _roundtrip(self, message):
+        self.writer.write(struct.pack('!I', len(message)) + message)
+        await self.writer.drain()
+        header = await self.reader.readexactly(4)
+        rxlen = struct.unpack('!I', header)[0]
+        return await self.reader.readexactly(rxlen)
+
+    async def write(self, message):
+        # Frames must not interleave, so coroutines sharing a transport take
+        # turns for the whole request/response exchange.
+        async with self._lock:
+            try:
+                return await asyncio.wait_for(self._roundtrip(message),
+                                              self.timeout)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError,
+                    struct.error) as e:
+                log.exception("Exception sending event to Riemann over TCP socket: %s", e)
+                raise TransportError(str(e) or e.__class__.__name__)
+
+
+class AsyncSSLTransport(AsyncTCPTransport):
+    @classmethod
+    async def connect(cls, host, port, keyfile=None, certfile=None,
+                      ca_certs=None, timeout=15.0, context=None,
+                      check_hostname=None):
+        log.debug("Using SSL Transport")
+
+        if context is None:
+            context = create_ssl_context(keyfile, certfile, ca_certs,
+                                         check_hostname)
+        return await super(AsyncSSLTransport, cls).connect(
+            host, port, timeout=timeout, ssl_context=context)
+
+
+class AsyncUDPTransport(object):
+    def __init__(self, transport):
+        self.transport = transport
+
+    @classmethod
+    async def connect(cls, host, port, timeout=15.0):
+        log.debug("Using UDP Transport")
+
+        loop = asyncio.get_event_loop()
+        try:
+            transport, protocol = await loop.create_datagram_endpoint(
+                asyncio.DatagramProtocol, remote_addr=(host, port),
+                family=socket.AF_UNSPEC)
+        except OSError as e:
+            log.exception("Exception opening socket: %s", e)
+            raise TransportError("Could not open socket.")
+        return cls(transport)
+
+    def close(self):
+        self.transport.close()
+
+    async def write(self, message):
+        try:
+            self.transport.sendto(message)
+        except OSError as e:
+            log.exception("Exception writing to socket: %s", e)
+            raise TransportError(str(e))
+
+
+class AsyncClient(object):
+    def __init__(self, host='127.0.0.1', port=5555, transport=AsyncTCPTransport):
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.connection = None
+
+    async def connect(self):
+        self.connection = await self.transport.connect(self.host, self.port)
+
+    async def disconnect(self):
+        # Nothing to close before the first send or after a failed connect.
+        if self.connection is None:
+            return
+        try:
+            self.connection.close()
+        except Exception as e:
+            log.exception("Exception disconnecting client: %s", e)
+            pass
+        self.connection = None
+
+    async def transmit(self, message):
+        for i in range(2):
+            if not self.connection:
+                await self.connect()
+            try:
+                raw = await self.connection.write(message.raw)
+                return Message(raw=raw)
+            except TransportError:
+                await self.disconnect()
+        return Message()
+
+    async def send(self, *events):
+        message = _build_message(events)
+        response = await self.transmit(message)
+        return response.ok
+
+    async def query(self, q, columnar=False, fields=None):
+        message = Message(query=q)
+        response = await self.transmit(message)
+        if columnar:
+            return to_columns(response.message.events, fields)
+        return response.events
+
+
+class AsyncSSLClient(AsyncClient):
+    def __init__(self, host='127.0.0.1', port=5554,
+                 keyfile=None, certfile=None, ca_certs=None, context=None,
+                 check_hostname=None):
+        AsyncClient.__init__(self, host=host, port=port,
+                             transport=AsyncSSLTransport)
+
+        self.keyfile = keyfile
+        self.certfile = certfile
+        self.ca_certs = ca_certs
+        self.check_hostname = check_hostname
+        self.context = context
+
+    async def connect(self):
+        if self.context is None:
+            self.context = create_ssl_context(self.keyfile, self.certfile,
+                                              self.ca_certs, self.check_hostname)
+        self.connection = await self.transport.connect(
+            self.host, self.port, context=self.context)
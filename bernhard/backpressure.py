@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -
+
+import collections
+import logging
+import random
+import threading
+import time
+
+from bernhard.pool import PooledClient
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    # Allows `rate` events per second on average and bursts of up to `burst`
+    # events. A take larger than the burst is allowed once the bucket is
+    # full, and leaves it in debt.
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.tokens = self.burst
+        self.updated = time.time()
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        self._refill()
+        return self.tokens
+
+    def ready(self, n):
+        return self.available() >= min(n, self.burst)
+
+    def take(self, n):
+        self._refill()
+        self.tokens -= n
+
+    def wait_time(self, n):
+        # Seconds until ready(n) becomes true.
+        missing = min(n, self.burst) - self.available()
+        return max(missing / self.rate, 0.0)
+
+
+class AIMDLimit(object):
+    # A concurrency limit adjusted from ack latency. Each fast ack adds
+    # 1/limit, about one per round trip's worth of acks, while the limit is
+    # in use. A slow ack or a failure multiplies the limit by `backoff`, at
+    # most once per round trip. Acks are slow when they take longer than
+    # latency_target, or, when that is None, `tolerance` times the fastest
+    # ack seen in the last `window` seconds.
+    def __init__(self, initial=4, min_limit=1, max_limit=64, backoff=0.5,
+                 latency_target=None, tolerance=2.0, window=30.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.tolerance = tolerance
+        self.window = window
+
+        self.increases = 0
+        self.decreases = 0
+        self.min_latency = None
+        self._window_start = time.time()
+        self._window_min = None
+        self._decreased = 0.0
+
+    @property
+    def value(self):
+        return max(self.min_limit, int(self.limit))
+
+    def target(self):
+        if self.latency_target is not None:
+            return self.latency_target
+        if self.min_latency is None:
+            return None
+        return self.tolerance * self.min_latency
+
+    def _observe(self, latency, now):
+        if self._window_min is None or latency < self._window_min:
+            self._window_min = latency
+        if self.min_latency is None or latency < self.min_latency:
+            self.min_latency = latency
+        if now - self._window_start >= self.window:
+            # Forget old minimums, so the baseline follows a slower network.
+            self.min_latency = self._window_min
+            self._window_min = None
+            self._window_start = now
+
+    def update(self, latency, ok, in_flight):
+        now = time.time()
+        target = self.target()
+        if ok:
+            self._observe(latency, now)
+        if not ok or (target is not None and latency > target):
+            if now - self._decreased >= latency:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._decreased = now
+                self.decreases += 1
+        elif in_flight * 2 >= self.value and self.limit < self.max_limit:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self.increases += 1
+
+
+class _Waiter(object):
+    __slots__ = ('n', 'evicted')
+
+    def __init__(self, n):
+        self.n = n
+        self.evicted = False
+
+
+class BackpressureClient(object):
+    # Sends through `client` at no more than `rate` events per second and
+    # with no more concurrent sends than an AIMD limit allows, so that a slow
+    # Riemann makes callers back off instead of piling up. When a send is
+    # over budget, `policy` decides what happens to it:
+    #
+    #   drop-newest  the send is dropped at once.
+    #   drop-oldest  the send queues; when max_waiting sends are queued the
+    #                oldest is dropped to make room.
+    #   block        the send queues until it fits or `deadline` passes.
+    #   sample       a random subset of the events, as many as the rate
+    #                allows, is sent and the rest dropped.
+    #
+    # Queued sends wait at most `deadline` seconds under every policy. Each
+    # policy's losses are counted, in events, in dropped_newest,
+    # dropped_oldest, timed_out and sampled_out. send() returns False for a
+    # send that was dropped. The client is called from several threads at
+    # once, so it must be thread-safe; by default it is a PooledClient.
+    POLICIES = ('drop-newest', 'drop-oldest', 'block', 'sample')
+
+    def __init__(self, client=None, rate=None, burst=None, policy='block',
+                 deadline=1.0, max_waiting=1000, initial_limit=4,
+                 min_limit=1, max_limit=64, latency_target=None):
+        if policy not in self.POLICIES:
+            raise ValueError("Unknown policy: %s" % policy)
+        self.client = (client if client is not None
+                       else PooledClient(max_size=max_limit))
+        self.policy = policy
+        self.deadline = deadline
+        self.max_waiting = max_waiting
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.limit = AIMDLimit(initial_limit, min_limit, max_limit,
+                               latency_target=latency_target)
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped_newest = 0
+        self.dropped_oldest = 0
+        self.timed_out = 0
+        self.sampled_out = 0
+
+        self._in_flight = 0
+        self._waiting = collections.deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._random = random.Random()
+
+    def _has_capacity(self, n):
+        if self._in_flight >= self.limit.value:
+            return False
+        return self.bucket is None or self.bucket.ready(n)
+
+    def _acquire(self, n):
+        self._in_flight += 1
+        if self.bucket is not None:
+            self.bucket.take(n)
+
+    def _admit(self, events):
+        # Returns the events to send, or None if the send was dropped.
+        n = len(events)
+        with self._cond:
+            if not self._waiting and self._has_capacity(n):
+                self._acquire(n)
+                return events
+            if self.policy == 'drop-newest':
+                self.dropped_newest += n
+                return None
+            if self.policy == 'sample':
+                return self._sample(events)
+            return self._wait(events)
+
+    def _sample(self, events):
+        n = len(events)
+        keep = n
+        if self.bucket is not None:
+            keep = min(n, int(self.bucket.available()))
+        if self._in_flight >= self.limit.value or keep <= 0:
+            self.sampled_out += n
+            return None
+        if keep < n:
+            events = self._random.sample(events, keep)
+            self.sampled_out += n - keep
+        self._acquire(keep)
+        return events
+
+    def _wait(self, events):
+        n = len(events)
+        if self.policy == 'drop-oldest' and len(self._waiting) >= self.max_waiting:
+            oldest = self._waiting.popleft()
+            oldest.evicted = True
+            self.dropped_oldest += oldest.n
+            self._cond.notify_all()
+        waiter = _Waiter(n)
+        self._waiting.append(waiter)
+        deadline = time.time() + self.deadline
+        while True:
+            if waiter.evicted:
+                return None
+            if self._waiting[0] is waiter and self._has_capacity(n):
+                self._waiting.popleft()
+                self._acquire(n)
+                self._cond.notify_all()
+                return events
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self._waiting.remove(waiter)
+                self.timed_out += n
+                self._cond.notify_all()
+                return None
+            if (self.bucket is not None and self._waiting[0] is waiter and
+                    self._in_flight < self.limit.value):
+                remaining = min(remaining, self.bucket.wait_time(n))
+            self._cond.wait(remaining)
+
+    def _release(self, n, latency, ok):
+        with self._cond:
+            in_flight = self._in_flight
+            self._in_flight -= 1
+            self.limit.update(latency, ok, in_flight)
+            if ok:
+                self.sent += n
+            else:
+                self.failed += n
+            self._cond.notify_all()
+
+    def send(self, *events):
+        events = self._admit(events)
+        if events is None:
+            return False
+        start = time.time()
+        ok = False
+        try:
+            ok = self.client.send(*events)
+        finally:
+            self._release(len(events), time.time() - start, ok)
+        return ok
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': self.limit.value,
+                'in_flight': self._in_flight,
+                'waiting': len(self._waiting),
+                'min_latency': self.limit.min_latency,
+                'sent': self.sent,
+                'failed': self.failed,
+                'dropped_newest': self.dropped_newest,
+                'dropped_oldest': self.dropped_oldest,
+                'timed_out': self.timed_out,
+                'sampled_out': self.sampled_out,
+            }
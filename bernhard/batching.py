@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -
+
+import collections
+import logging
+import threading
+import time
+
+from bernhard import Client, Message, pb, _fill_event, _fork_handlers
+
+log = logging.getLogger(__name__)
+
+
+class BatchingClient(object):
+    # Queues events and sends them as multi-event Msg frames from a
+    # background thread. A frame is flushed once it holds max_events events
+    # or max_bytes bytes, or when the oldest queued event is flush_interval
+    # seconds old. Events sent while max_buffer events are queued are dropped,
+    # and send() then returns False.
+    def __init__(self, client=None, max_events=500, max_bytes=1 << 20,
+                 flush_interval=1.0, max_buffer=10000):
+        self.client = client if client is not None else Client()
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.frames = 0
+
+        self._buffer = collections.deque()
+        self._buffer_bytes = 0
+        self._oldest = None
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        self._send_lock = threading.Lock()
+
+        self._start_flusher()
+        _fork_handlers.add(self)
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(target=self._flush_loop,
+                                         name='bernhard-batch-flusher')
+        self._flusher.daemon = True
+        self._flusher.start()
+
+    def _after_fork(self):
+        # Queued events are the parent's to send, and the flusher thread did
+        # not survive the fork.
+        self._buffer = collections.deque()
+        self._buffer_bytes = 0
+        self._oldest = None
+        self._cond = threading.Condition(threading.Lock())
+        self._send_lock = threading.Lock()
+        if not self._closed:
+            self._start_flusher()
+
+    def send(self, *events):
+        with self._cond:
+            if self._closed:
+                self.dropped += len(events)
+                return False
+            was_empty = not self._buffer
+            dropped = 0
+            for params in events:
+                if len(self._buffer) >= self.max_buffer:
+                    dropped += 1
+                    continue
+                event = _fill_event(pb.Event(), params)
+                size = event.ByteSize()
+                if not self._buffer:
+                    self._oldest = time.time()
+                self._buffer.append((event, size))
+                self._buffer_bytes += size
+                self.queued += 1
+            self.dropped += dropped
+            if self._full() or (was_empty and self._buffer):
+                self._cond.notify()
+        return not dropped
+
+    def flush(self):
+        with self._send_lock:
+            while True:
+                with self._cond:
+                    batch = self._take()
+                if not batch:
+                    return
+                self._transmit(batch)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._flusher.join()
+        self.flush()
+        self.client.disconnect()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'buffered': len(self._buffer),
+                'buffered_bytes': self._buffer_bytes,
+                'queued': self.queued,
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'frames': self.frames,
+            }
+
+    def _full(self):
+        return (len(self._buffer) >= self.max_events or
+                self._buffer_bytes >= self.max_bytes)
+
+    def _take(self):
+        batch = []
+        size = 0
+        while self._buffer and len(batch) < self.max_events:
+            event, event_size = self._buffer[0]
+            if batch and size + event_size > self.max_bytes:
+                break
+            self._buffer.popleft()
+            batch.append(event)
+            size += event_size
+        self._buffer_bytes -= size
+        self._oldest = time.time() if self._buffer else None
+        return batch
+
+    def _transmit(self, batch):
+        try:
+            message = Message()
+            message.message.events.extend(batch)
+            ok = self.client.transmit(message).ok
+        except Exception as e:
+            log.exception("Exception flushing events to Riemann: %s", e)
+            ok = False
+        if ok:
+            self.flushed += len(batch)
+            self.frames += 1
+        else:
+            self.failed += len(batch)
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._full():
+                    if self._oldest is None:
+                        self._cond.wait()
+                        continue
+                    remaining = self._oldest + self.flush_interval - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+            self.flush()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -
+
+import bisect
+import hashlib
+import logging
+import struct
+import threading
+import time
+
+from bernhard import Client, Message, TransportError, _build_message
+
+log = logging.getLogger(__name__)
+
+
+def _hash(key):
+    return struct.unpack('>Q', hashlib.md5(key).digest()[:8])[0]
+
+
+def _key(params):
+    # Events of one series always hash the same way, so they reach the same
+    # node's index.
+    host = params.get('host') or ''
+    service = params.get('service') or ''
+    return (u'%s\x00%s' % (host, service)).encode('utf-8')
+
+
+class HashRing(object):
+    # A consistent hash ring with `replicas` points per node, so adding or
+    # removing a node only moves the series that hashed next to it.
+    def __init__(self, nodes, replicas=100):
+        self.nodes = list(nodes)
+        self.replicas = replicas
+        points = []
+        for node in self.nodes:
+            for i in range(replicas):
+                points.append((_hash(('%s:%s-%d' % (node + (i,))).encode('utf-8')), node))
+        points.sort()
+        self._hashes = [h for h, node in points]
+        self._nodes = [node for h, node in points]
+
+    def preference(self, key):
+        # All nodes, in the order they follow the key on the ring. The first
+        # is the key's owner and the rest are its failover order.
+        if not self._nodes:
+            return
+        start = bisect.bisect(self._hashes, _hash(key))
+        seen = set()
+        for i in range(len(self._nodes)):
+            node = self._nodes[(start + i) % len(self._nodes)]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == len(self.nodes):
+                    return
+
+    def get(self, key):
+        for node in self.preference(key):
+            return node
+
+
+class CircuitBreaker(object):
+    # Opens after failure_threshold consecutive failures, so the node is
+    # skipped without waiting on a connect timeout. After reset_timeout
+    # seconds one request is let through; if it succeeds the breaker closes,
+    # otherwise it opens again.
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = None
+        self.trips = 0
+
+    def allow(self):
+        if self.state == self.OPEN:
+            if time.time() - self.opened < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.state = self.CLOSED
+
+    def failure(self):
+        self.failures += 1
+        if (self.state == self.HALF_OPEN or
+                self.failures >= self.failure_threshold):
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened = time.time()
+
+
+def _parse_node(node):
+    if isinstance(node, tuple):
+        return node
+    host, sep, port = node.rpartition(':')
+    if not sep:
+        return (node, 5555)
+    return (host.strip('[]'), int(port))
+
+
+class ClusterClient(object):
+    # Holds a client per Riemann node. Events are routed by a consistent
+    # hash of their host and service; when a node fails with a TransportError
+    # its events go to the next node on the ring, and each node has a
+    # circuit breaker so a dead node is not retried on every send. Queries
+    # are sent to every available node and the results merged. Like Client,
+    # a ClusterClient must not be shared between threads.
+    encoder = None
+
+    def __init__(self, nodes, client=Client, replicas=100,
+                 failure_threshold=3, reset_timeout=30.0, **client_args):
+        self.nodes = [_parse_node(node) for node in nodes]
+        if not self.nodes:
+            raise ValueError("ClusterClient needs at least one node")
+        self.ring = HashRing(self.nodes, replicas)
+        self.clients = {}
+        self.breakers = {}
+        for host, port in self.nodes:
+            self.clients[(host, port)] = client(host=host, port=port, **client_args)
+            self.breakers[(host, port)] = CircuitBreaker(failure_threshold,
+                                                         reset_timeout)
+        self.sent = dict((node, 0) for node in self.nodes)
+        self.failovers = 0
+        self.undeliverable = 0
+
+    def route(self, params, exclude=()):
+        # The first node on the event's ring order that is not excluded and
+        # whose breaker lets requests through, or None.
+        for node in self.ring.preference(_key(params)):
+            if node not in exclude and self.breakers[node].allow():
+                return node
+        return None
+
+    def _write(self, node, data):
+        client = self.clients[node]
+        breaker = self.breakers[node]
+        try:
+            if not client.connection:
+                client._connect()
+            raw = client.connection.write(data)
+        except TransportError as e:
+            log.warning("Riemann node %s:%s failed: %s", node[0], node[1], e)
+            if client.connection:
+                client.disconnect()
+            breaker.failure()
+            raise
+        breaker.success()
+        return Message(raw=raw)
+
+    def _encode(self, events):
+        if self.encoder is not None:
+            return Message(encoded=self.encoder(events)).raw
+        return _build_message(events).raw
+
+    def send(self, *events):
+        ok = True
+        failed = set()
+        pending = events
+        while pending:
+            groups = {}
+            for params in pending:
+                groups.setdefault(self.route(params, failed), []).append(params)
+            pending = []
+            for node, group in groups.items():
+                if node is None:
+                    self.undeliverable += len(group)
+                    ok = False
+                    continue
+                try:
+                    response = self._write(node, self._encode(group))
+                except TransportError:
+                    failed.add(node)
+                    self.failovers += len(group)
+                    pending.extend(group)
+                    continue
+                self.sent[node] += len(group)
+                ok = ok and bool(response.ok)
+        return ok
+
+    def query(self, q):
+        # Queries every node whose breaker is closed, in parallel, and
+        # returns the matching events as a list. A series found on more than
+        # one node, which happens after a failover, is reported once, with
+        # its most recent event. Raises TransportError only if no node
+        # answered.
+        nodes = [node for node in self.nodes if self.breakers[node].allow()]
+        data = Message(query=q).raw
+        results = {}
+
+        def run(node):
+            try:
+                results[node] = self._write(node, data)
+            except TransportError as e:
+                results[node] = e
+
+        threads = [threading.Thread(target=run, args=(node,)) for node in nodes[1:]]
+        for thread in threads:
+            thread.start()
+        if nodes:
+            run(nodes[0])
+        for thread in threads:
+            thread.join()
+
+        merged = {}
+        answered = False
+        for node in nodes:
+            response = results[node]
+            if isinstance(response, TransportError):
+                continue
+            answered = True
+            for event in response.events:
+                key = (event.host, event.service)
+                current = merged.get(key)
+                if current is None or (event.time or 0) > (current.time or 0):
+                    merged[key] = event
+        if not answered:
+            raise TransportError("No Riemann node answered the query.")
+        return list(merged.values())
+
+    def disconnect(self):
+        for client in self.clients.values():
+            if client.connection:
+                client.disconnect()
+
+    def stats(self):
+        return {
+            'nodes': dict(('%s:%s' % node, {
+                'state': self.breakers[node].state,
+                'trips': self.breakers[node].trips,
+                'sent': self.sent[node],
+            }) for node in self.nodes),
+            'failovers': self.failovers,
+            'undeliverable': self.undeliverable,
+        }
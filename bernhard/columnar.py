@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -
+
+import array
+import operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+STRING_FIELDS = ('host', 'service', 'state', 'description')
+NUMERIC_TYPES = {
+    'time': ('q', 'int64'),
+    'ttl': ('d', 'float64'),
+    'metric_f': ('d', 'float64'),
+    'metric_d': ('d', 'float64'),
+    'metric_sint64': ('q', 'int64'),
+}
+NUMERIC_NAMES = ('time', 'ttl', 'metric', 'metric_f', 'metric_d',
+                 'metric_sint64')
+SCALAR_NAMES = frozenset(STRING_FIELDS) | frozenset(NUMERIC_TYPES)
+FIELDS = SCALAR_NAMES | frozenset(['metric', 'tags', 'attributes'])
+
+
+def _array(typecode, dtype, values):
+    if numpy is not None:
+        return numpy.array(values, dtype=dtype)
+    if typecode == 'q' and 'q' not in array.typecodes:
+        typecode = 'l'
+    return array.array(typecode, values)
+
+
+class Columns(object):
+    # Query results as parallel columns, one per requested field. Numeric
+    # columns are NumPy arrays when NumPy is installed and array.array
+    # otherwise. String columns are lists in which equal values share one
+    # string object. Tags and attributes are flattened: the entries for event
+    # i are tags[tag_offsets[i]:tag_offsets[i + 1]], and likewise for
+    # attributes.
+    def __init__(self, columns, count):
+        self.columns = columns
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getattr__(self, name):
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def keys(self):
+        return self.columns.keys()
+
+    def as_dict(self):
+        return dict(self.columns)
+
+
+def to_columns(events, fields=None):
+    # Decodes a repeated pb.Event field in a single pass, without creating
+    # Event wrappers. Only the requested fields are read; by default that is
+    # every string and numeric field plus tags and attributes.
+    if fields is None:
+        fields = STRING_FIELDS + NUMERIC_NAMES + ('tags', 'attributes')
+    for name in fields:
+        if name not in FIELDS:
+            raise ValueError("Unknown event field: %s" % name)
+    scalars = [name for name in fields if name in SCALAR_NAMES]
+    want_metric = 'metric' in fields
+    want_tags = 'tags' in fields
+    want_attributes = 'attributes' in fields
+
+    interned = {}
+    intern = interned.setdefault
+    get = operator.attrgetter(*scalars) if scalars else None
+    single = len(scalars) == 1
+
+    rows, metric = [], []
+    tags, tag_offsets = [], [0]
+    attribute_keys, attribute_values, attribute_offsets = [], [], [0]
+    count = 0
+
+    for e in events:
+        count += 1
+        if get is not None:
+            rows.append((get(e),) if single else get(e))
+        if want_metric:
+            if e.HasField('metric_sint64'):
+                metric.append(e.metric_sint64)
+            elif e.HasField('metric_d'):
+                metric.append(e.metric_d)
+            else:
+                metric.append(e.metric_f)
+        if want_tags:
+            for tag in e.tags:
+                tags.append(intern(tag, tag))
+            tag_offsets.append(len(tags))
+        if want_attributes:
+            for a in e.attributes:
+                attribute_keys.append(intern(a.key, a.key))
+                attribute_values.append(intern(a.value, a.value))
+            attribute_offsets.append(len(attribute_keys))
+
+    columns = {}
+    values = list(zip(*rows)) if rows else [()] * len(scalars)
+    for name, column in zip(scalars, values):
+        if name in STRING_FIELDS:
+            columns[name] = [intern(v, v) for v in column]
+        else:
+            typecode, dtype = NUMERIC_TYPES[name]
+            columns[name] = _array(typecode, dtype, column)
+    if want_metric:
+        columns['metric'] = _array('d', 'float64', metric)
+    if want_tags:
+        columns['tags'] = tags
+        columns['tag_offsets'] = _array('q', 'int64', tag_offsets)
+    if want_attributes:
+        columns['attribute_keys'] = attribute_keys
+        columns['attribute_values'] = attribute_values
+        columns['attribute_offsets'] = _array('q', 'int64', attribute_offsets)
+    return Columns(columns, count)
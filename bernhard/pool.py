@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -
+
+import collections
+import contextlib
+import logging
+import select
+import socket
+import threading
+import time
+
+from bernhard import (Client, Event, Message, SSLTransport, TCPTransport,
+                      TransportError, _MSG_EVENTS_FIELD, _close_socket,
+                      create_ssl_context, pb, wait_ready)
+
+log = logging.getLogger(__name__)
+
+
+class ConnectionPool(object):
+    # A bounded set of transports shared between threads. Idle connections
+    # are reused most-recently-used first, closed once they have been idle
+    # for max_idle_time seconds, and checked for a dead peer before reuse.
+    def __init__(self, factory, max_size=8, max_idle_time=60.0, timeout=15.0):
+        self.factory = factory
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.timeout = timeout
+
+        self.size = 0
+        self.checkouts = 0
+        self.created = 0
+        self.evicted = 0
+        self.unhealthy = 0
+        self.discarded = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+        self._idle = collections.deque()
+        self._cond = threading.Condition(threading.Lock())
+
+    def _after_fork(self):
+        # Idle sockets are shared with the parent, and checked out ones
+        # belong to threads that did not survive the fork; start empty.
+        for connection, since in self._idle:
+            _close_socket(connection)
+        self._idle = collections.deque()
+        self.size = 0
+        self._cond = threading.Condition(threading.Lock())
+
+    def checkout(self, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        start = time.time()
+        waited = False
+        with self._cond:
+            while True:
+                self._evict(start)
+                while self._idle:
+                    connection, since = self._idle.pop()
+                    if self._healthy(connection):
+                        self._record(start, waited)
+                        return connection
+                    self.unhealthy += 1
+                    self._close(connection)
+                if self.size < self.max_size:
+                    self.size += 1
+                    self._record(start, waited)
+                    break
+                remaining = None
+                if timeout is not None:
+                    remaining = start + timeout - time.time()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise TransportError("Timed out waiting for a pooled connection.")
+                waited = True
+                self._cond.wait(remaining)
+
+        try:
+            connection = self.factory()
+        except Exception:
+            with self._cond:
+                self.size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.created += 1
+        return connection
+
+    def checkin(self, connection, discard=False):
+        with self._cond:
+            if discard:
+                self.discarded += 1
+                self._close(connection)
+            else:
+                self._idle.append((connection, time.time()))
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        connection = self.checkout(timeout)
+        try:
+            yield connection
+        except TransportError:
+            self.checkin(connection, discard=True)
+            raise
+        except Exception:
+            self.checkin(connection)
+            raise
+        else:
+            self.checkin(connection)
+
+    def clear(self):
+        with self._cond:
+            while self._idle:
+                connection, since = self._idle.popleft()
+                self._close(connection)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': self.size - len(self._idle),
+                'checkouts': self.checkouts,
+                'created': self.created,
+                'evicted': self.evicted,
+                'unhealthy': self.unhealthy,
+                'discarded': self.discarded,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_time_total': self.wait_time_total,
+                'wait_time_max': self.wait_time_max,
+            }
+
+    def _record(self, start, waited):
+        self.checkouts += 1
+        if waited:
+            elapsed = time.time() - start
+            self.waits += 1
+            self.wait_time_total += elapsed
+            self.wait_time_max = max(self.wait_time_max, elapsed)
+
+    def _evict(self, now):
+        # The oldest idle connections sit at the left end of the deque.
+        while self._idle and now - self._idle[0][1] > self.max_idle_time:
+            connection, since = self._idle.popleft()
+            self.evicted += 1
+            self._close(connection)
+
+    def _close(self, connection):
+        self.size -= 1
+        try:
+            connection.close()
+        except Exception as e:
+            log.exception("Exception closing pooled connection: %s", e)
+
+    def _healthy(self, connection):
+        # An idle connection has nothing to read; if it is readable the peer
+        # has closed it or sent something unexpected.
+        sock = getattr(connection, 'sock', None)
+        if sock is None:
+            return True
+        try:
+            readable = wait_ready([sock], 0)
+        except (socket.error, ValueError, select.error):
+            return False
+        return not readable
+
+
+class PooledClient(Client):
+    def __init__(self, host='127.0.0.1', port=5555, transport=TCPTransport,
+                 max_size=8, max_idle_time=60.0, timeout=15.0,
+                 connect_timeout=None, read_timeout=None, **transport_args):
+        Client.__init__(self, host=host, port=port, transport=transport,
+                        connect_timeout=connect_timeout,
+                        read_timeout=read_timeout)
+
+        self.transport_args = transport_args
+        self.pool = ConnectionPool(self._open, max_size=max_size,
+                                   max_idle_time=max_idle_time,
+                                   timeout=timeout)
+
+        # For TLS, as in SSLClient, one SSLContext is shared by every pooled
+        # connection and new connections offer the session of the last one.
+        self.context = None
+        self.session = None
+        self._last_connection = None
+        self._tls_lock = threading.Lock()
+        self._tls = isinstance(transport, type) and issubclass(transport, SSLTransport)
+        if self._tls:
+            self.context = transport_args.pop('context', None)
+            self._tls_files = dict((k, transport_args.pop(k, None))
+                                   for k in ('keyfile', 'certfile', 'ca_certs',
+                                             'check_hostname'))
+
+    def _after_fork(self):
+        self.pool._after_fork()
+
+    def _tls_args(self):
+        with self._tls_lock:
+            if self.context is None:
+                self.context = create_ssl_context(**self._tls_files)
+            session = getattr(self._last_connection, 'session', None)
+            if session is not None:
+                self.session = session
+            args = {'context': self.context}
+            if self.session is not None:
+                args['session'] = self.session
+            return args
+
+    def _open(self):
+        args = self._transport_args()
+        args.update(self.transport_args)
+        if self._tls:
+            args.update(self._tls_args())
+        connection = self.transport(self.host, self.port, **args)
+        connection.instrumentation = self.instrumentation
+        if self._tls:
+            self._last_connection = connection
+        return connection
+
+    def connect(self):
+        self.pool.checkin(self.pool.checkout())
+
+    def disconnect(self):
+        self.pool.clear()
+
+    def transmit(self, message):
+        for i in range(2):
+            connection = self.pool.checkout()
+            try:
+                raw = connection.write(message.raw)
+            except TransportError:
+                self.pool.checkin(connection, discard=True)
+                continue
+            self.pool.checkin(connection)
+            return Message(raw=raw)
+        return Message()
+
+    def query_iter(self, q):
+        # The connection goes back to the pool only once the response has
+        # been read to the end.
+        message = Message(query=q)
+        connection = self.pool.checkout()
+        finished = False
+        try:
+            for number, value in connection.stream(message.raw):
+                if number == _MSG_EVENTS_FIELD:
+                    yield Event(event=pb.Event.FromString(value))
+            finished = True
+        finally:
+            self.pool.checkin(connection, discard=not finished)
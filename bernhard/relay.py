@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -
+
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+
+from bernhard import (Client, Message, TransportError, UDPClient,
+                      UnixDatagramTransport, wait_ready)
+
+log = logging.getLogger(__name__)
+
+
+class RelayClient(UDPClient):
+    # Sends events as datagrams to a Forwarder listening on the Unix socket
+    # at `path`, so that many worker processes on a host share the
+    # forwarder's single connection to Riemann. Like UDPClient, send()
+    # returns whether the datagrams were written, not whether Riemann
+    # accepted them. When the forwarder is not running, or its queue stays
+    # full for write_timeout seconds, send() returns False.
+    def __init__(self, path, max_datagram_size=64 * 1024, write_timeout=1.0):
+        UDPClient.__init__(self, host=path, port=None,
+                           max_datagram_size=max_datagram_size,
+                           transport=UnixDatagramTransport)
+        self.read_timeout = write_timeout
+
+    def send(self, *events):
+        try:
+            return UDPClient.send(self, *events)
+        except TransportError as e:
+            log.warning("Could not send events to the relay: %s", e)
+            return False
+
+
+class Forwarder(object):
+    # Receives Msg datagrams from RelayClients and sends them on to Riemann
+    # through `client`. Datagrams hold only events, so they are concatenated
+    # into one Msg, which protobuf reads as the union of their events. A Msg
+    # is sent once it reaches max_bytes, or flush_interval seconds after its
+    # first datagram arrived.
+    def __init__(self, path, client=None, max_bytes=1 << 20,
+                 flush_interval=0.5, max_datagram_size=64 * 1024,
+                 receive_buffer=4 * 1024 * 1024):
+        self.path = path
+        self.client = client if client is not None else Client()
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_datagram_size = max_datagram_size
+
+        self.received = 0
+        self.frames = 0
+        self.failed = 0
+
+        self._pending = []
+        self._pending_bytes = 0
+        self._oldest = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+        if os.path.exists(path):
+            os.unlink(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                                 receive_buffer)
+        except socket.error as e:
+            log.warning("Could not set the relay socket's receive buffer: %s", e)
+        self.sock.bind(path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        name='bernhard-relay-forwarder')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        while not self._stopped.is_set():
+            timeout = self.flush_interval
+            if self._oldest is not None:
+                timeout = max(self._oldest + self.flush_interval - time.time(), 0)
+            if wait_ready([self.sock], min(timeout, 0.5)):
+                self._receive()
+            if self._pending_bytes >= self.max_bytes or (
+                    self._oldest is not None and
+                    time.time() - self._oldest >= self.flush_interval):
+                self.flush()
+        self.flush()
+
+    def _receive(self):
+        # Drains everything queued on the socket without blocking.
+        while self._pending_bytes < self.max_bytes:
+            try:
+                data = self.sock.recv(self.max_datagram_size, socket.MSG_DONTWAIT)
+            except socket.error:
+                return
+            if self._oldest is None:
+                self._oldest = time.time()
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+            self.received += 1
+
+    def flush(self):
+        if not self._pending:
+            return True
+        data = b''.join(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+        self._oldest = None
+        try:
+            ok = self.client.transmit(Message(encoded=data)).ok
+        except TransportError as e:
+            log.warning("Exception forwarding events to Riemann: %s", e)
+            ok = False
+        if ok:
+            self.frames += 1
+        else:
+            self.failed += 1
+        return ok
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def stats(self):
+        return {
+            'received': self.received,
+            'frames': self.frames,
+            'failed': self.failed,
+            'pending': len(self._pending),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Forward events from local RelayClients to Riemann.')
+    parser.add_argument('--path', required=True)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--flush-interval', type=float, default=0.5)
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    forwarder = Forwarder(args.path, Client(args.host, args.port),
+                          flush_interval=args.flush_interval)
+    try:
+        forwarder.serve_forever()
+    except KeyboardInterrupt:
+        forwarder.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+SUFFIX = '.spool'
+CURSOR = 'cursor'
+
+
+class Spool(object):
+    # An on-disk queue of serialized Msg frames for events that could not be
+    # delivered. Frames are appended to segment files with the same 4-byte
+    # length prefix used on the wire. A new segment is started once the
+    # current one reaches segment_size, and the oldest segments are deleted
+    # when the spool grows past max_bytes. The replay position is kept in a
+    # cursor file so that frames are not replayed twice after a restart.
+    # Frames hold only events, so replay concatenates up to
+    # replay_batch_bytes of them into one Msg, which protobuf reads as the
+    # union of their events, and sends it in a single round trip.
+    def __init__(self, directory, segment_size=16 * 1024 * 1024,
+                 max_bytes=256 * 1024 * 1024, replay_rate=1000.0,
+                 replay_burst=100, replay_batch_bytes=1024 * 1024):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_bytes = max_bytes
+        self.replay_rate = replay_rate
+        self.replay_burst = replay_burst
+        self.replay_batch_bytes = replay_batch_bytes
+
+        self.spooled = 0
+        self.replayed = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+
+        self._lock = threading.Lock()
+        self._segments = []
+        self._frames = {}
+        self._sizes = {}
+        self._active = None
+        self._cursor = (0, 0)
+        self._tokens = float(replay_burst)
+        self._refilled = time.time()
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._load()
+
+    def _path(self, seq):
+        return os.path.join(self.directory, '%020d%s' % (seq, SUFFIX))
+
+    def _load(self):
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(SUFFIX):
+                self._segments.append(int(name[:-len(SUFFIX)]))
+        try:
+            with open(os.path.join(self.directory, CURSOR)) as f:
+                seq, offset = f.read().split()
+                self._cursor = (int(seq), int(offset))
+        except (IOError, OSError, ValueError):
+            pass
+        for seq in list(self._segments):
+            if seq < self._cursor[0]:
+                self._remove(seq)
+                continue
+            start = self._cursor[1] if seq == self._cursor[0] else 0
+            self._sizes[seq], self._frames[seq] = self._scan(seq, start)
+
+    def _scan(self, seq, start):
+        # Counts the frames after `start`, truncating a partly written frame
+        # left behind by a crash.
+        path = self._path(seq)
+        size = os.path.getsize(path)
+        frames, offset = 0, start
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while offset + 4 <= size:
+                length = struct.unpack('!I', f.read(4))[0]
+                if offset + 4 + length > size:
+                    break
+                f.seek(length, os.SEEK_CUR)
+                offset += 4 + length
+                frames += 1
+        if offset < size:
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+            size = offset
+        return size, frames
+
+    def _remove(self, seq):
+        try:
+            os.remove(self._path(seq))
+        except OSError as e:
+            log.exception("Exception removing spool segment: %s", e)
+        self._segments.remove(seq)
+        self._sizes.pop(seq, None)
+        self._frames.pop(seq, None)
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, CURSOR)
+        with open(path + '.tmp', 'w') as f:
+            f.write('%d %d' % self._cursor)
+        os.rename(path + '.tmp', path)
+
+    def _rotate(self):
+        if self._active is not None:
+            self._active.close()
+        seq = self._segments[-1] + 1 if self._segments else 0
+        self._segments.append(seq)
+        self._sizes[seq] = 0
+        self._frames[seq] = 0
+        self._active = open(self._path(seq), 'ab')
+
+    def append(self, raw):
+        size = 4 + len(raw)
+        if size > self.max_bytes:
+            log.warning("Dropping %d byte frame larger than the spool", size)
+            return False
+        with self._lock:
+            seq = self._segments[-1] if self._segments else None
+            if (self._active is None or
+                    self._sizes[seq] + size > self.segment_size):
+                self._rotate()
+                seq = self._segments[-1]
+            self._active.write(struct.pack('!I', len(raw)))
+            self._active.write(raw)
+            self._active.flush()
+            self._sizes[seq] += size
+            self._frames[seq] += 1
+            self.spooled += 1
+            self._evict()
+        return True
+
+    def _evict(self):
+        # Oldest first; the segment being written is never evicted.
+        while self._bytes() > self.max_bytes and len(self._segments) > 1:
+            seq = self._segments[0]
+            self.evicted += self._frames[seq]
+            self.evicted_bytes += self._sizes[seq] - self._offset(seq)
+            self._remove(seq)
+            if self._cursor[0] <= seq:
+                self._cursor = (self._segments[0], 0)
+                self._save_cursor()
+
+    def _offset(self, seq):
+        return self._cursor[1] if seq == self._cursor[0] else 0
+
+    def _bytes(self):
+        return sum(self._sizes[seq] - self._offset(seq)
+                   for seq in self._segments)
+
+    def depth(self):
+        with self._lock:
+            return {
+                'frames': sum(self._frames.values()),
+                'bytes': self._bytes(),
+                'segments': len(self._segments),
+                'spooled': self.spooled,
+                'replayed': self.replayed,
+                'rejected': self.rejected,
+                'evicted': self.evicted,
+                'evicted_bytes': self.evicted_bytes,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return sum(self._frames.values())
+
+    def _take_tokens(self, limit):
+        now = time.time()
+        self._tokens = min(float(self.replay_burst),
+                           self._tokens + (now - self._refilled) * self.replay_rate)
+        self._refilled = now
+        allowed = int(self._tokens)
+        if limit is not None:
+            allowed = min(allowed, limit)
+        return allowed
+
+    def replay(self, write, limit=None):
+        # Sends spooled frames, oldest first, through write(raw), in batches
+        # of consecutive frames. write returns whether Riemann acknowledged
+        # the batch; the frames of a rejected batch are counted and dropped.
+        # Replay is paced at replay_rate frames per second, and stops at the
+        # first TransportError, which is re-raised once the cursor has been
+        # saved.
+        with self._lock:
+            allowed = self._take_tokens(limit)
+            replayed = 0
+            try:
+                while replayed < allowed and self._segments:
+                    seq = self._segments[0]
+                    if seq == self._cursor[0]:
+                        offset = self._cursor[1]
+                    else:
+                        offset = 0
+                    if offset >= self._sizes[seq]:
+                        if seq == self._segments[-1] and self._active is not None:
+                            break
+                        self._remove(seq)
+                        self._cursor = (seq + 1, 0)
+                        continue
+                    if seq == self._segments[-1] and self._active is not None:
+                        self._active.flush()
+                    with open(self._path(seq), 'rb') as f:
+                        data = mmap.mmap(f.fileno(), self._sizes[seq],
+                                         access=mmap.ACCESS_READ)
+                    try:
+                        while replayed < allowed and offset < self._sizes[seq]:
+                            batch = []
+                            end = offset
+                            size = 0
+                            while (replayed + len(batch) < allowed and
+                                   end < self._sizes[seq]):
+                                length = struct.unpack_from('!I', data, end)[0]
+                                if batch and size + length > self.replay_batch_bytes:
+                                    break
+                                batch.append(data[end + 4:end + 4 + length])
+                                end += 4 + length
+                                size += length
+                            n = len(batch)
+                            if write(b''.join(batch)):
+                                self.replayed += n
+                            else:
+                                self.rejected += n
+                            offset = end
+                            replayed += n
+                            self._tokens -= n
+                            self._frames[seq] -= n
+                            self._cursor = (seq, offset)
+                    finally:
+                        data.close()
+            finally:
+                if replayed:
+                    self._save_cursor()
+        return replayed
+
+    def close(self):
+        with self._lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -
+
+import collections
+import logging
+import os
+import shutil
+import socket
+import ssl
+import struct
+import tempfile
+import threading
+import time
+
+from bernhard import pb
+
+log = logging.getLogger(__name__)
+
+
+class FakeRiemannServer(object):
+    # An in-process stand-in for a Riemann server, for tests and benchmarks.
+    # It speaks the length-prefixed Msg framing over TCP, TLS and Unix
+    # stream sockets ('unix'), and bare Msg datagrams over UDP and Unix
+    # datagram sockets ('unix-dgram'). Unix sockets are created at `path`,
+    # or in a temporary directory. Received events are kept in `events` and
+    # returned for any query. Each reply is delayed by `latency` seconds and
+    # carries `ok` and `error`; with ack=False no replies are sent at all.
+    PROTOCOLS = ('tcp', 'tls', 'udp', 'unix', 'unix-dgram')
+
+    def __init__(self, host='127.0.0.1', port=0, protocol='tcp', latency=0.0,
+                 ok=True, error=None, ack=True, store=True,
+                 certfile=None, keyfile=None, ca_certs=None, path=None):
+        if protocol not in self.PROTOCOLS:
+            raise ValueError("Unknown protocol: %s" % protocol)
+        self.host = host
+        self.port = port
+        self.path = path
+        self.protocol = protocol
+        self.latency = latency
+        self.ok = ok
+        self.error = error
+        self.ack = ack
+        self.store = store
+
+        self.context = None
+        if protocol == 'tls':
+            self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.context.load_cert_chain(certfile, keyfile)
+            if ca_certs:
+                self.context.load_verify_locations(ca_certs)
+                self.context.verify_mode = ssl.CERT_OPTIONAL
+
+        self.events = []
+        self.frames = 0
+        self.received = 0
+        self.connections = 0
+
+        self._lock = threading.Lock()
+        self._sock = None
+        self._tmpdir = None
+        self._clients = []
+        self._threads = []
+        self._running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def address(self):
+        if self.protocol.startswith('unix'):
+            return self.path
+        return (self.host, self.port)
+
+    def start(self):
+        datagram = self.protocol in ('udp', 'unix-dgram')
+        socktype = socket.SOCK_DGRAM if datagram else socket.SOCK_STREAM
+        if self.protocol.startswith('unix'):
+            if self.path is None:
+                self._tmpdir = tempfile.mkdtemp()
+                self.path = os.path.join(self._tmpdir, 'riemann.sock')
+            self._sock = socket.socket(socket.AF_UNIX, socktype)
+            self._sock.bind(self.path)
+        else:
+            self._sock = socket.socket(socket.AF_INET, socktype)
+            if not datagram:
+                self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._sock.bind((self.host, self.port))
+            self.port = self._sock.getsockname()[1]
+        if datagram:
+            target = self._serve_udp
+        else:
+            self._sock.listen(128)
+            target = self._serve_stream
+        self._sock.settimeout(0.1)
+        self._running = True
+        self._spawn(target)
+        return self
+
+    def stop(self):
+        self._running = False
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for sock in clients:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+                sock.close()
+            except socket.error:
+                pass
+        for thread in self._threads:
+            thread.join(1.0)
+        self._sock.close()
+        if self.protocol.startswith('unix'):
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+            self.path = None
+
+    def reset(self):
+        with self._lock:
+            self.events = []
+            self.frames = 0
+            self.received = 0
+
+    def _spawn(self, target, *args):
+        thread = threading.Thread(target=target, args=args,
+                                  name='bernhard-fake-riemann')
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def _respond(self, raw):
+        msg = pb.Msg.FromString(raw)
+        with self._lock:
+            self.frames += 1
+            self.received += len(msg.events)
+            if self.store:
+                self.events.extend(msg.events)
+            if not self.ack:
+                return None
+            reply = pb.Msg()
+            reply.ok = self.ok
+            if self.error is not None:
+                reply.error = self.error
+            if msg.HasField('query'):
+                reply.events.extend(self.events)
+        return reply.SerializeToString()
+
+    def _serve_udp(self):
+        while self._running:
+            try:
+                data = self._sock.recv(65536)
+            except socket.timeout:
+                continue
+            except socket.error:
+                return
+            self._respond(data)
+
+    def _serve_stream(self):
+        while self._running:
+            try:
+                sock, addr = self._sock.accept()
+            except socket.timeout:
+                continue
+            except socket.error:
+                return
+            sock.settimeout(None)
+            with self._lock:
+                self.connections += 1
+            thread = threading.Thread(target=self._handle, args=(sock,),
+                                      name='bernhard-fake-riemann-conn')
+            thread.daemon = True
+            thread.start()
+
+    def _handle(self, sock):
+        # Replies are written by a separate thread once `latency` has passed
+        # since the request arrived, so that latency behaves like a network
+        # round trip and pipelined requests overlap.
+        replies = collections.deque()
+        ready = threading.Condition(threading.Lock())
+        writer = None
+        try:
+            if self.context is not None:
+                sock = self.context.wrap_socket(sock, server_side=True)
+            with self._lock:
+                self._clients.append(sock)
+            writer = threading.Thread(target=self._write_replies,
+                                      args=(sock, replies, ready),
+                                      name='bernhard-fake-riemann-writer')
+            writer.daemon = True
+            writer.start()
+            stream = sock.makefile('rb')
+            while self._running:
+                header = stream.read(4)
+                if len(header) < 4:
+                    break
+                raw = stream.read(struct.unpack('!I', header)[0])
+                reply = self._respond(raw)
+                if reply is not None:
+                    with ready:
+                        replies.append((time.time() + self.latency, reply))
+                        ready.notify()
+        except (socket.error, ValueError) as e:
+            log.debug("Fake Riemann connection closed: %s", e)
+        finally:
+            if writer is not None:
+                with ready:
+                    replies.append((None, None))
+                    ready.notify()
+                writer.join(1.0 + self.latency)
+            try:
+                sock.close()
+            except socket.error:
+                pass
+
+    def _write_replies(self, sock, replies, ready):
+        try:
+            while True:
+                with ready:
+                    while not replies:
+                        ready.wait()
+                    due, reply = replies.popleft()
+                if reply is None:
+                    return
+                delay = due - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                sock.sendall(struct.pack('!I', len(reply)) + reply)
+        except (socket.error, ValueError) as e:
+            log.debug("Fake Riemann connection closed: %s", e)
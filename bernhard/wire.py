@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -
+
+# Encodes Riemann messages straight from Python values, following the field
+# numbers in proto.proto, without building protobuf objects. Fields are
+# written in field number order, as protobuf itself does, so the output is
+# byte-for-byte what SerializeToString produces for the same values. This
+# module does not import protobuf.
+
+import io
+import struct
+import sys
+
+if sys.version_info[0] < 3:
+    string_type = basestring
+    text_type = unicode
+else:
+    string_type = str
+    text_type = str
+
+VARINT, FIXED64, LENGTH, FIXED32 = 0, 1, 2, 5
+
+_pack_float = struct.Struct('<f').pack
+_pack_double = struct.Struct('<d').pack
+
+
+def encode_varint(value):
+    if value < 0:
+        value += 1 << 64
+    if value < 0x80:
+        return bytes(bytearray((value,)))
+    data = bytearray()
+    while value > 0x7f:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def varint_size(value):
+    if value < 0:
+        return 10
+    size = 1
+    while value > 0x7f:
+        value >>= 7
+        size += 1
+    return size
+
+
+def zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def tag(number, wire_type):
+    return encode_varint(number << 3 | wire_type)
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
+
+
+def _length_delimited(key, data):
+    return key + encode_varint(len(data)) + data
+
+
+def _string(key):
+    return lambda value: _length_delimited(key, _text(value))
+
+
+def _int64(key):
+    return lambda value: key + encode_varint(int(value))
+
+
+def _sint64(key):
+    return lambda value: key + encode_varint(zigzag(int(value)))
+
+
+def _float(key):
+    return lambda value: key + _pack_float(value)
+
+
+def _double(key):
+    return lambda value: key + _pack_double(value)
+
+
+def _bool(key):
+    return lambda value: key + (b'\x01' if value else b'\x00')
+
+
+def _tags(key):
+    def encode(values):
+        return b''.join([_length_delimited(key, _text(v)) for v in values])
+    return encode
+
+
+def _attribute_value(value):
+    if isinstance(value, bytes):
+        return value
+    if not isinstance(value, string_type):
+        value = text_type(value)
+    return value.encode('utf-8')
+
+
+_ATTRIBUTE_KEY = tag(1, LENGTH)
+_ATTRIBUTE_VALUE = tag(2, LENGTH)
+
+
+def _attributes(key):
+    def encode(attributes):
+        if type(attributes) != dict:
+            raise TypeError("'attributes' parameter must be type 'dict'")
+        parts = []
+        for k, v in attributes.items():
+            data = (_length_delimited(_ATTRIBUTE_KEY, _text(k)) +
+                    _length_delimited(_ATTRIBUTE_VALUE, _attribute_value(v)))
+            parts.append(_length_delimited(key, data))
+        return b''.join(parts)
+    return encode
+
+
+# Event fields by name: (field number, encoder). `metric` is an alias for
+# metric_f, as it is for bernhard.Event.
+EVENT_FIELDS = {
+    'time': (1, _int64(tag(1, VARINT))),
+    'state': (2, _string(tag(2, LENGTH))),
+    'service': (3, _string(tag(3, LENGTH))),
+    'host': (4, _string(tag(4, LENGTH))),
+    'description': (5, _string(tag(5, LENGTH))),
+    'tags': (7, _tags(tag(7, LENGTH))),
+    'ttl': (8, _float(tag(8, FIXED32))),
+    'attributes': (9, _attributes(tag(9, LENGTH))),
+    'metric_sint64': (13, _sint64(tag(13, VARINT))),
+    'metric_d': (14, _double(tag(14, FIXED64))),
+    'metric_f': (15, _float(tag(15, FIXED32))),
+}
+EVENT_FIELDS['metric'] = EVENT_FIELDS['metric_f']
+
+_MSG_OK = _bool(tag(2, VARINT))
+_MSG_ERROR = _string(tag(3, LENGTH))
+_MSG_QUERY = tag(5, LENGTH)
+_QUERY_STRING = _string(tag(1, LENGTH))
+MSG_EVENTS = tag(6, LENGTH)
+
+
+def encode_event(params):
+    # Keys that are not event fields are ignored, as bernhard.Client.send
+    # ignores them.
+    fields = []
+    for name, value in params.items():
+        field = EVENT_FIELDS.get(name)
+        if field is not None:
+            fields.append((field[0], field[1], value))
+    fields.sort(key=lambda field: field[0])
+    return b''.join([encode(value) for number, encode, value in fields])
+
+
+def encode_rows(names, rows):
+    # Encodes tuples whose items are the event fields in `names`, which is
+    # cheaper than a dict per event.
+    fields = []
+    for i, name in enumerate(names):
+        if name not in EVENT_FIELDS:
+            raise ValueError("Unknown event field: %s" % name)
+        number, encode = EVENT_FIELDS[name]
+        fields.append((number, i, encode))
+    fields.sort()
+    encoders = [(i, encode) for number, i, encode in fields]
+    return [b''.join([encode(row[i]) for i, encode in encoders if row[i] is not None])
+            for row in rows]
+
+
+def _column(name, value):
+    # Returns the values of a column as a list, or None for a single value to
+    # be used for every event. Tags are a column only when given as one list
+    # of tags per event.
+    if value is None or isinstance(value, (string_type, bytes, dict)):
+        return None
+    if hasattr(value, 'tolist'):
+        # NumPy arrays and pandas series; tolist also gives Python values,
+        # which encode much faster than NumPy scalars.
+        value = value.tolist()
+        if not isinstance(value, list):
+            return None
+    elif hasattr(value, '__iter__'):
+        value = list(value)
+    else:
+        return None
+    if name == 'tags' and all(isinstance(v, (string_type, bytes)) for v in value):
+        return None
+    return value
+
+
+def encode_columns(columns):
+    # Encodes events from a dict of field name to either a sequence with one
+    # value per event or a single value shared by all of them. Shared values
+    # are encoded once and prefixed to every event, as in EventTemplate.
+    shared = {}
+    names = []
+    values = []
+    for name, value in columns.items():
+        if name not in EVENT_FIELDS:
+            raise ValueError("Unknown event field: %s" % name)
+        column = _column(name, value)
+        if column is not None:
+            names.append(name)
+            values.append(column)
+        elif value is not None:
+            shared[name] = value
+    prefix = encode_event(shared)
+    if not names:
+        return [prefix]
+    count = len(values[0])
+    for name, column in zip(names, values):
+        if len(column) != count:
+            raise ValueError("Column %s has %d values, expected %d"
+                             % (name, len(column), count))
+    events = encode_rows(names, zip(*values))
+    if prefix:
+        events = [prefix + data for data in events]
+    return events
+
+
+def frame_events(encoded_events):
+    # Joins encoded events into the bytes of a Msg carrying them.
+    parts = []
+    for data in encoded_events:
+        parts.append(MSG_EVENTS)
+        parts.append(encode_varint(len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def frame_chunks(encoded_events, max_size):
+    # Like frame_events, but starts a new Msg whenever the next event would
+    # take it past max_size bytes. An event larger than that on its own is
+    # sent in a Msg by itself.
+    frames = []
+    parts = []
+    size = 0
+    for data in encoded_events:
+        length = encode_varint(len(data))
+        n = len(MSG_EVENTS) + len(length) + len(data)
+        if parts and size + n > max_size:
+            frames.append(b''.join(parts))
+            parts = []
+            size = 0
+        parts.append(MSG_EVENTS)
+        parts.append(length)
+        parts.append(data)
+        size += n
+    if parts:
+        frames.append(b''.join(parts))
+    return frames
+
+
+def encode_message(events=None, query=None, ok=None, error=None):
+    parts = []
+    if ok is not None:
+        parts.append(_MSG_OK(ok))
+    if error is not None:
+        parts.append(_MSG_ERROR(error))
+    if query is not None:
+        parts.append(_length_delimited(_MSG_QUERY, _QUERY_STRING(str(query))))
+    if events:
+        parts.append(frame_events([encode_event(e) for e in events]))
+    return b''.join(parts)
+
+
+def read_varint(read):
+    # Reads a varint with read(n), returning (value, bytes consumed).
+    value = shift = size = 0
+    while True:
+        byte = bytearray(read(1))[0]
+        size += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, size
+        shift += 7
+        if shift >= 70:
+            raise ValueError("Malformed varint")
+
+
+def iter_fields(read, length):
+    # Decodes the top-level fields of a message of `length` bytes read
+    # incrementally with read(n), yielding (field number, value) pairs as
+    # they arrive. Varints are yielded as ints, length-delimited fields as
+    # bytes, and fixed-width fields as their raw bytes.
+    remaining = length
+    while remaining > 0:
+        key, size = read_varint(read)
+        remaining -= size
+        number, wire_type = key >> 3, key & 7
+        if wire_type == VARINT:
+            value, size = read_varint(read)
+        elif wire_type == LENGTH:
+            value, size = read_varint(read)
+            remaining -= value
+            value = read(value)
+        elif wire_type == FIXED64:
+            value, size = read(8), 8
+        elif wire_type == FIXED32:
+            value, size = read(4), 4
+        else:
+            raise ValueError("Unsupported wire type %d" % wire_type)
+        remaining -= size
+        yield number, value
+    if remaining:
+        raise ValueError("Message fields overran its length")
+
+
+def decode_ack(data):
+    # Reads ok and error from a Msg, as (ok, error), stopping at the first
+    # later field so that a large response is not scanned.
+    ok, error = False, u''
+    reader = io.BytesIO(data)
+    for number, value in iter_fields(reader.read, len(data)):
+        if number == 2:
+            ok = bool(value)
+        elif number == 3:
+            error = value.decode('utf-8')
+        elif number > 3:
+            break
+    return ok, error
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -
+
+import os
+import unittest
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def use_high_fds(test, count=1100):
+    # Holds `count` file descriptors open until the end of the test, so that
+    # sockets opened during it get descriptors above select()'s limit of
+    # 1024. Skips the test when the process may not open that many.
+    if resource is not None:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY and soft < count + 100:
+            raise unittest.SkipTest("needs %d open files" % (count + 100))
+    fds = []
+    test.addCleanup(lambda: [os.close(fd) for fd in fds])
+    fd = os.open(os.devnull, os.O_RDONLY)
+    fds.append(fd)
+    while fd < count:
+        fd = os.dup(fds[0])
+        fds.append(fd)
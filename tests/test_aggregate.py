@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -
+
+import random
+import unittest
+
+import bernhard
+from bernhard.aggregate import Aggregator, LogHistogram
+from bernhard.testing import FakeRiemannServer
+
+
+class LogHistogramTest(unittest.TestCase):
+    def test_quantiles_within_relative_accuracy(self):
+        rng = random.Random(0)
+        values = sorted(rng.lognormvariate(0, 2) for i in range(10000))
+        histogram = LogHistogram(0.01)
+        for value in values:
+            histogram.add(value)
+        for q in (0.0, 0.5, 0.95, 0.99, 1.0):
+            expected = values[int(q * (len(values) - 1))]
+            self.assertAlmostEqual(histogram.quantile(q) / expected, 1.0,
+                                   delta=0.0101)
+
+    def test_negative_and_zero(self):
+        histogram = LogHistogram(0.01)
+        for value in (-5, 0, 0, 5):
+            histogram.add(value)
+        self.assertAlmostEqual(histogram.quantile(0), -5, delta=0.05)
+        self.assertEqual(histogram.quantile(0.5), 0.0)
+        self.assertAlmostEqual(histogram.quantile(1), 5, delta=0.05)
+
+    def test_merge(self):
+        a, b = LogHistogram(), LogHistogram()
+        a.add(1)
+        b.add(100)
+        a.merge(b)
+        self.assertEqual(a.count, 2)
+        self.assertAlmostEqual(a.quantile(1), 100, delta=1)
+        self.assertIsNone(LogHistogram().quantile(0.5))
+
+
+class AggregatorTest(unittest.TestCase):
+    def test_sends_one_summary_per_series(self):
+        with FakeRiemannServer() as server:
+            agg = Aggregator(bernhard.Client(port=server.port), start=False,
+                             metric='max', percentiles=(0.5,))
+            for i in range(1, 11):
+                agg.send({'host': 'h', 'service': 'latency', 'metric': i})
+            agg.send({'host': 'h', 'service': 'other', 'metric': 1,
+                      'tags': ['b', 'a']})
+            agg.send({'host': 'h', 'service': 'other', 'metric': 3,
+                      'tags': ['a', 'b']})
+            self.assertEqual(server.received, 0)
+            self.assertTrue(agg.flush())
+            self.assertEqual(server.received, 2)
+
+            events = dict((e.service, e) for e in server.events)
+            latency = bernhard.Event(event=events['latency'])
+            attributes = dict((a.key, a.value) for a in latency.attributes)
+            self.assertEqual(latency.metric, 10)
+            self.assertEqual(float(attributes['count']), 10)
+            self.assertEqual(float(attributes['mean']), 5.5)
+            self.assertEqual(float(attributes['min']), 1)
+            self.assertAlmostEqual(float(attributes['p50']), 5, delta=0.1)
+            self.assertEqual(bernhard.Event(event=events['other']).metric, 3)
+            self.assertEqual(agg.stats()['emitted'], 2)
+            agg.close()
+
+    def test_events_without_metric_pass_through(self):
+        with FakeRiemannServer() as server:
+            agg = Aggregator(bernhard.Client(port=server.port), start=False)
+            self.assertTrue(agg.send({'host': 'h', 'state': 'ok'}))
+            self.assertEqual(server.received, 1)
+            self.assertTrue(agg.flush())
+            self.assertEqual(server.received, 1)
+            agg.close()
+
+    def test_background_flush(self):
+        with FakeRiemannServer() as server:
+            agg = Aggregator(bernhard.Client(port=server.port), interval=0.01)
+            agg.send({'host': 'h', 'metric': 1})
+            for i in range(500):
+                if server.received:
+                    break
+                agg._stopped.wait(0.01)
+            self.assertEqual(server.received, 1)
+            agg.close()
+
+    def test_unknown_statistic(self):
+        self.assertRaises(ValueError, Aggregator, metric='median', start=False)
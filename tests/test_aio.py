@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -
+
+import logging
+import unittest
+
+try:
+    import asyncio
+    from bernhard.aio import AsyncClient, AsyncUDPTransport
+except (ImportError, SyntaxError):
+    asyncio = None
+
+from bernhard.testing import FakeRiemannServer
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@unittest.skipIf(asyncio is None, "needs asyncio")
+class AsyncClientTest(unittest.TestCase):
+    def test_send_and_query(self):
+        async def main(port):
+            client = AsyncClient(port=port)
+            ok = await client.send({'host': 'a', 'metric': 1})
+            events = await client.query('true')
+            await client.disconnect()
+            return ok, [e.host for e in events]
+
+        with FakeRiemannServer() as server:
+            self.assertEqual(run(main(server.port)), (True, ['a']))
+
+    def test_udp(self):
+        async def main(port):
+            client = AsyncClient(port=port, transport=AsyncUDPTransport)
+            await client.send({'host': 'a'})
+            await client.disconnect()
+
+        with FakeRiemannServer(protocol='udp') as server:
+            run(main(server.port))
+            for i in range(100):
+                if server.received:
+                    break
+                run(asyncio.sleep(0.01))
+            self.assertEqual(server.received, 1)
+
+    def test_disconnect_without_connection(self):
+        async def main():
+            client = AsyncClient(port=1)
+            await client.disconnect()
+            await client.disconnect()
+
+        with self.assertLogs('bernhard', logging.DEBUG) as logs:
+            logging.getLogger('bernhard').debug("marker")
+            run(main())
+        self.assertEqual(len(logs.records), 1)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -
+
+import threading
+import time
+import unittest
+
+import bernhard
+from bernhard.backpressure import AIMDLimit, BackpressureClient, TokenBucket
+from bernhard.pool import PooledClient
+from bernhard.testing import FakeRiemannServer
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=100, burst=10)
+        self.assertTrue(bucket.ready(10))
+        bucket.take(10)
+        self.assertFalse(bucket.ready(1))
+        self.assertAlmostEqual(bucket.wait_time(1), 0.01, delta=0.005)
+        time.sleep(0.03)
+        self.assertTrue(bucket.ready(2))
+
+    def test_large_take_waits_for_full_bucket(self):
+        bucket = TokenBucket(rate=1000, burst=5)
+        self.assertTrue(bucket.ready(50))
+        bucket.take(50)
+        self.assertTrue(bucket.available() < 0)
+
+
+class AIMDLimitTest(unittest.TestCase):
+    def test_increases_while_fast_and_in_use(self):
+        limit = AIMDLimit(initial=4, latency_target=1.0)
+        for i in range(20):
+            limit.update(0.001, True, in_flight=limit.value)
+        self.assertTrue(limit.value > 4)
+        value = limit.value
+        for i in range(20):
+            limit.update(0.001, True, in_flight=0)
+        self.assertEqual(limit.value, value)
+
+    def test_backs_off_on_failure(self):
+        limit = AIMDLimit(initial=16, backoff=0.5)
+        limit.update(0.001, False, in_flight=1)
+        self.assertEqual(limit.value, 8)
+        self.assertEqual(limit.decreases, 1)
+
+    def test_slow_acks_against_min_latency(self):
+        limit = AIMDLimit(initial=16, tolerance=2.0)
+        limit.update(0.01, True, in_flight=1)
+        limit.update(0.05, True, in_flight=1)
+        self.assertEqual(limit.value, 8)
+
+
+class BackpressureClientTest(unittest.TestCase):
+    def test_round_trip(self):
+        with FakeRiemannServer() as server:
+            client = BackpressureClient(PooledClient(port=server.port))
+            self.assertTrue(client.send({'host': 'a'}))
+            self.assertEqual(server.received, 1)
+            stats = client.stats()
+            self.assertEqual((stats['sent'], stats['in_flight']), (1, 0))
+            client.client.disconnect()
+
+    def test_rate_limit_blocks(self):
+        with FakeRiemannServer() as server:
+            client = BackpressureClient(PooledClient(port=server.port),
+                                        rate=200, burst=5, deadline=5.0)
+            start = time.time()
+            for i in range(15):
+                self.assertTrue(client.send({'host': 'a'}))
+            self.assertTrue(time.time() - start >= 0.04)
+            self.assertEqual(server.received, 15)
+            client.client.disconnect()
+
+    def test_drop_newest(self):
+        with FakeRiemannServer() as server:
+            client = BackpressureClient(PooledClient(port=server.port),
+                                        rate=1, burst=2, policy='drop-newest')
+            self.assertTrue(client.send({'host': 'a'}, {'host': 'b'}))
+            self.assertFalse(client.send({'host': 'c'}))
+            self.assertEqual(client.stats()['dropped_newest'], 1)
+            client.client.disconnect()
+
+    def test_sample(self):
+        with FakeRiemannServer() as server:
+            client = BackpressureClient(PooledClient(port=server.port),
+                                        rate=0.001, burst=5, policy='sample')
+            self.assertTrue(client.send({'host': 'a'}, {'host': 'b'}))
+            self.assertTrue(client.send(*[{'host': 'h-%d' % i} for i in range(10)]))
+            self.assertEqual(server.received, 5)
+            self.assertEqual(client.stats()['sampled_out'], 7)
+            client.client.disconnect()
+
+    def test_deadline(self):
+        with FakeRiemannServer() as server:
+            client = BackpressureClient(PooledClient(port=server.port),
+                                        rate=0.001, burst=1, deadline=0.05)
+            self.assertTrue(client.send({'host': 'a'}))
+            self.assertFalse(client.send({'host': 'b'}))
+            self.assertEqual(client.stats()['timed_out'], 1)
+            client.client.disconnect()
+
+    def test_drop_oldest(self):
+        with FakeRiemannServer(latency=0.2) as server:
+            client = BackpressureClient(
+                PooledClient(port=server.port), policy='drop-oldest',
+                initial_limit=1, max_limit=1, max_waiting=1, deadline=5.0)
+            results = {}
+
+            def send(name):
+                results[name] = client.send({'host': name})
+
+            first = threading.Thread(target=send, args=('first',))
+            first.start()
+            time.sleep(0.05)
+            second = threading.Thread(target=send, args=('second',))
+            second.start()
+            time.sleep(0.05)
+            send('third')
+            first.join()
+            second.join()
+            self.assertEqual(results, {'first': True, 'second': False,
+                                       'third': True})
+            self.assertEqual(client.stats()['dropped_oldest'], 1)
+            client.client.disconnect()
+
+    def test_failures_are_counted(self):
+        with FakeRiemannServer(ok=False) as server:
+            client = BackpressureClient(PooledClient(port=server.port))
+            self.assertFalse(client.send({'host': 'a'}))
+            self.assertEqual(client.stats()['failed'], 1)
+            client.client.disconnect()
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, BackpressureClient,
+                          bernhard.Client(), policy='nope')
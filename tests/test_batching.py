@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -
+
+import time
+import unittest
+
+import bernhard
+from bernhard.batching import BatchingClient
+from bernhard.testing import FakeRiemannServer
+
+
+class BatchingClientTest(unittest.TestCase):
+    def test_events_are_sent_in_one_frame(self):
+        with FakeRiemannServer() as server:
+            client = BatchingClient(bernhard.Client(port=server.port),
+                                    flush_interval=60)
+            for i in range(10):
+                self.assertTrue(client.send({'host': 'host-%d' % i}))
+            client.flush()
+            self.assertEqual(server.frames, 1)
+            self.assertEqual([e.host for e in server.events],
+                             ['host-%d' % i for i in range(10)])
+            self.assertEqual(client.stats()['flushed'], 10)
+            client.close()
+
+    def test_flushes_at_max_events(self):
+        with FakeRiemannServer() as server:
+            client = BatchingClient(bernhard.Client(port=server.port),
+                                    max_events=5, flush_interval=60)
+            client.send(*[{'host': 'a'} for i in range(12)])
+            client.close()
+            self.assertEqual(server.received, 12)
+            self.assertEqual(server.frames, 3)
+
+    def test_flushes_after_interval(self):
+        with FakeRiemannServer() as server:
+            client = BatchingClient(bernhard.Client(port=server.port),
+                                    flush_interval=0.01)
+            client.send({'host': 'a'})
+            for i in range(500):
+                if server.received:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(server.received, 1)
+            client.close()
+
+    def test_send_returns_false_when_buffer_is_full(self):
+        with FakeRiemannServer() as server:
+            client = BatchingClient(bernhard.Client(port=server.port),
+                                    max_buffer=3, flush_interval=60)
+            self.assertTrue(client.send({'host': 'a'}, {'host': 'b'}))
+            self.assertFalse(client.send({'host': 'c'}, {'host': 'd'}))
+            self.assertFalse(client.send({'host': 'e'}))
+            self.assertEqual(client.stats()['dropped'], 2)
+            client.close()
+            self.assertEqual([e.host for e in server.events], ['a', 'b', 'c'])
+            self.assertFalse(client.send({'host': 'f'}))
+
+    def test_failed_flush_is_counted(self):
+        with FakeRiemannServer() as server:
+            port = server.port
+        client = BatchingClient(bernhard.Client(port=port, connect_timeout=1.0),
+                                flush_interval=60)
+        client.send({'host': 'a'})
+        client.flush()
+        self.assertEqual(client.stats()['failed'], 1)
+        client.close()
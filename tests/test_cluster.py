@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -
+
+import socket
+import unittest
+
+from bernhard import TransportError
+from bernhard.cluster import CircuitBreaker, ClusterClient, HashRing, _key
+from bernhard.testing import FakeRiemannServer
+
+EVENTS = [{'host': 'host-%d' % i, 'service': 'cpu'} for i in range(100)]
+
+
+def closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class HashRingTest(unittest.TestCase):
+    def test_preference_lists_every_node_once(self):
+        nodes = [('a', 1), ('b', 1), ('c', 1)]
+        ring = HashRing(nodes)
+        for i in range(50):
+            order = list(ring.preference(('key %d' % i).encode('utf-8')))
+            self.assertEqual(sorted(order), nodes)
+            self.assertEqual(order[0], ring.get(('key %d' % i).encode('utf-8')))
+
+    def test_removing_a_node_only_moves_its_keys(self):
+        nodes = [('a', 1), ('b', 1), ('c', 1)]
+        before, after = HashRing(nodes), HashRing(nodes[:2])
+        for i in range(200):
+            key = ('key %d' % i).encode('utf-8')
+            if before.get(key) != ('c', 1):
+                self.assertEqual(after.get(key), before.get(key))
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_and_half_opens(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+        breaker.failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.trips, 1)
+
+    def test_stays_open_until_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.failure()
+        self.assertFalse(breaker.allow())
+
+
+class ClusterClientTest(unittest.TestCase):
+    def test_events_are_sharded(self):
+        with FakeRiemannServer() as a, FakeRiemannServer() as b:
+            client = ClusterClient(['127.0.0.1:%d' % a.port,
+                                    ('127.0.0.1', b.port)])
+            self.assertTrue(client.send(*EVENTS))
+            self.assertEqual(a.received + b.received, 100)
+            self.assertTrue(a.received and b.received)
+            # Each series always reaches the same node.
+            for server in (a, b):
+                node = ('127.0.0.1', server.port)
+                for event in server.events:
+                    self.assertEqual(client.ring.get(_key(
+                        {'host': event.host, 'service': event.service})), node)
+            self.assertEqual(len(client.query('true')), 100)
+            client.disconnect()
+
+    def test_failover(self):
+        with FakeRiemannServer() as server:
+            dead = ('127.0.0.1', closed_port())
+            client = ClusterClient([dead, ('127.0.0.1', server.port)],
+                                   failure_threshold=1, connect_timeout=1.0)
+            self.assertTrue(client.send(*EVENTS))
+            self.assertEqual(server.received, 100)
+            stats = client.stats()
+            self.assertTrue(stats['failovers'] > 0)
+            self.assertEqual(stats['nodes']['%s:%s' % dead]['state'], 'open')
+            # The open breaker skips the dead node without trying it.
+            failovers = stats['failovers']
+            self.assertTrue(client.send(*EVENTS))
+            self.assertEqual(client.stats()['failovers'], failovers)
+            self.assertEqual(len(client.query('true')), 100)
+            client.disconnect()
+
+    def test_undeliverable(self):
+        client = ClusterClient([('127.0.0.1', closed_port())],
+                               connect_timeout=1.0)
+        self.assertFalse(client.send({'host': 'a'}))
+        self.assertEqual(client.stats()['undeliverable'], 1)
+        self.assertRaises(TransportError, client.query, 'true')
+
+    def test_needs_a_node(self):
+        self.assertRaises(ValueError, ClusterClient, [])
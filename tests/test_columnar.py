@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -
+
+import unittest
+
+import bernhard
+from bernhard.columnar import to_columns
+from bernhard.testing import FakeRiemannServer
+
+EVENTS = [
+    {'host': 'a', 'service': 'cpu', 'metric': 1.5, 'time': 10,
+     'tags': ['x', 'y'], 'attributes': {'dc': 'east'}},
+    {'host': 'b', 'service': 'cpu', 'metric': 7, 'time': 20},
+    {'host': 'a', 'service': 'disk', 'metric': 2.25, 'time': 30,
+     'tags': ['x']},
+]
+
+
+class ColumnarTest(unittest.TestCase):
+    def test_query_columnar(self):
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port)
+            client.send(*EVENTS)
+            columns = client.query('true', columnar=True)
+            client.disconnect()
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(columns.host, ['a', 'b', 'a'])
+        self.assertIs(columns.host[0], columns.host[2])
+        self.assertEqual(list(columns.metric), [1.5, 7.0, 2.25])
+        self.assertEqual(list(columns['time']), [10, 20, 30])
+        self.assertEqual(columns.tags, ['x', 'y', 'x'])
+        self.assertEqual(list(columns.tag_offsets), [0, 2, 2, 3])
+        self.assertEqual(columns.attribute_keys, ['dc'])
+        self.assertEqual(columns.attribute_values, ['east'])
+        self.assertEqual(list(columns.attribute_offsets), [0, 1, 1, 1])
+
+    def test_selected_fields(self):
+        events = bernhard._build_message(EVENTS).message.events
+        columns = to_columns(events, ['service'])
+        self.assertEqual(list(columns.keys()), ['service'])
+        self.assertEqual(columns.service, ['cpu', 'cpu', 'disk'])
+        self.assertRaises(AttributeError, getattr, columns, 'host')
+
+    def test_no_events(self):
+        columns = to_columns([], ['host', 'metric'])
+        self.assertEqual(len(columns), 0)
+        self.assertEqual(columns.host, [])
+        self.assertEqual(list(columns.metric), [])
+
+    def test_unknown_field(self):
+        self.assertRaises(ValueError, to_columns, [], ['nope'])
+
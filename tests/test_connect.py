@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -
+
+import socket
+import unittest
+
+import bernhard
+from bernhard import Resolver, TCPTransport, connect_parallel, interleave
+from bernhard.testing import FakeRiemannServer
+
+from tests.support import use_high_fds
+
+
+def closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class ResolverTest(unittest.TestCase):
+    def test_caches_addresses(self):
+        resolver = Resolver(ttl=60)
+        first = resolver.resolve('127.0.0.1', 5555)
+        self.assertEqual(resolver.resolve('127.0.0.1', 5555), first)
+        self.assertEqual((resolver.hits, resolver.misses), (1, 1))
+        resolver.invalidate('127.0.0.1', 5555)
+        resolver.resolve('127.0.0.1', 5555)
+        self.assertEqual(resolver.misses, 2)
+
+    def test_unknown_host(self):
+        self.assertRaises(bernhard.TransportError, Resolver().resolve,
+                          'nonexistent.invalid', 5555)
+
+    def test_interleave(self):
+        addresses = [(socket.AF_INET6, 1), (socket.AF_INET6, 2),
+                     (socket.AF_INET, 3), (socket.AF_INET, 4),
+                     (socket.AF_INET, 5)]
+        self.assertEqual([a[1] for a in interleave(addresses)], [1, 3, 2, 4, 5])
+
+
+class ConnectParallelTest(unittest.TestCase):
+    def addresses(self, *ports):
+        return [socket.getaddrinfo('127.0.0.1', port, socket.AF_INET,
+                                   socket.SOCK_STREAM)[0] for port in ports]
+
+    def test_skips_refused_address(self):
+        with FakeRiemannServer() as server:
+            sock = connect_parallel(
+                self.addresses(closed_port(), server.port), delay=5.0)
+            self.assertEqual(sock.getpeername()[1], server.port)
+            sock.close()
+
+    def test_all_refused(self):
+        self.assertRaises(socket.error, connect_parallel,
+                          self.addresses(closed_port(), closed_port()))
+
+    def test_no_addresses(self):
+        self.assertRaises(socket.error, connect_parallel, [])
+
+    def test_high_file_descriptors(self):
+        use_high_fds(self)
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port)
+            self.assertTrue(client.send({'host': 'a'}))
+            self.assertTrue(client.connection.sock.fileno() >= 1024)
+            client.disconnect()
+
+    def test_transport_error_when_refused(self):
+        self.assertRaises(bernhard.TransportError, TCPTransport,
+                          '127.0.0.1', closed_port(), resolver=Resolver())
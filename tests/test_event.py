@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -
+
+import unittest
+
+import bernhard
+
+PARAMS = {'host': 'h', 'service': 's', 'state': 'ok', 'time': 1,
+          'description': 'd', 'ttl': 60.0, 'metric': 2.5,
+          'tags': ['a', 'b'], 'attributes': {'k': 'v', 'n': 1}}
+
+
+class EventConstructionTest(unittest.TestCase):
+    def test_build_message_matches_event(self):
+        expected = bernhard.Event(params=PARAMS).event
+        message = bernhard._build_message([PARAMS, PARAMS])
+        self.assertEqual(list(message.message.events), [expected, expected])
+
+    def test_unknown_keys_are_ignored(self):
+        message = bernhard._build_message([{'host': 'h', 'nope': 1}])
+        self.assertEqual(message.message.events[0],
+                         bernhard.Event(params={'host': 'h'}).event)
+
+    def test_event_fields(self):
+        event = bernhard.Event(params=PARAMS)
+        self.assertEqual(event.host, 'h')
+        self.assertEqual(event.metric, 2.5)
+        self.assertEqual(list(event.tags), ['a', 'b'])
+        self.assertEqual(sorted((a.key, a.value) for a in event.attributes),
+                         [('k', 'v'), ('n', '1')])
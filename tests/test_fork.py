@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -
+
+import os
+import unittest
+
+import bernhard
+from bernhard.batching import BatchingClient
+from bernhard.pool import PooledClient
+from bernhard.testing import FakeRiemannServer
+
+
+@unittest.skipIf(not hasattr(os, 'register_at_fork'), "needs os.register_at_fork")
+class ForkTest(unittest.TestCase):
+    def in_child(self, check):
+        # Runs check() in a forked child and fails unless it returns True.
+        pid = os.fork()
+        if pid == 0:
+            try:
+                code = 0 if check() else 1
+            except BaseException:
+                code = 2
+            os._exit(code)
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+
+    def test_child_reconnects(self):
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port)
+            client.send({'host': 'parent'})
+            parent_connection = client.connection
+
+            def check():
+                return (client.connection is None and
+                        client.send({'host': 'child'}))
+
+            self.in_child(check)
+            self.assertIs(client.connection, parent_connection)
+            self.assertTrue(client.send({'host': 'parent'}))
+            self.assertEqual(server.connections, 2)
+            self.assertEqual(sorted(e.host for e in server.events),
+                             ['child', 'parent', 'parent'])
+            client.disconnect()
+
+    def test_child_pool_and_pipeline(self):
+        with FakeRiemannServer() as server:
+            pooled = PooledClient(port=server.port)
+            pipelined = bernhard.PipelinedClient(port=server.port)
+            pooled.send({'host': 'a'})
+            pipelined.send_nowait({'host': 'b'})
+            pipelined.flush(5.0)
+
+            def check():
+                return (pooled.pool.stats()['size'] == 0 and
+                        pooled.send({'host': 'c'}) and
+                        pipelined.send_async({'host': 'd'}).result(5.0))
+
+            self.in_child(check)
+            self.assertEqual(server.connections, 4)
+            self.assertEqual(server.received, 4)
+            pooled.disconnect()
+            pipelined.disconnect()
+
+    def test_child_batching_client(self):
+        with FakeRiemannServer() as server:
+            client = BatchingClient(bernhard.Client(port=server.port),
+                                    flush_interval=60)
+            client.send({'host': 'queued'})
+
+            def check():
+                # Events queued before the fork are the parent's to send.
+                if client.stats()['buffered'] != 0:
+                    return False
+                client.send({'host': 'child'})
+                client.close()
+                return True
+
+            self.in_child(check)
+            client.close()
+            self.assertEqual(sorted(e.host for e in server.events),
+                             ['child', 'queued'])
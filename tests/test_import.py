@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -
+
+import os
+import subprocess
+import sys
+import unittest
+
+from bernhard.testing import FakeRiemannServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(code, *args):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    return subprocess.check_output(
+        [sys.executable, '-c', code] + [str(a) for a in args],
+        env=env).decode('utf-8').strip()
+
+
+class ImportTest(unittest.TestCase):
+    def test_protobuf_is_loaded_lazily(self):
+        self.assertEqual(run(
+            'import sys, bernhard\n'
+            'from bernhard import wire\n'
+            'wire.encode_message([{"host": "h"}])\n'
+            'loaded = "bernhard.proto_pb2" in sys.modules\n'
+            'bernhard.Event(params={"host": "h"})\n'
+            'print(loaded, "bernhard.proto_pb2" in sys.modules)\n'
+            'print("pkg_resources" in sys.modules)'), 'False True\nFalse')
+
+    def test_send_without_protobuf(self):
+        # Blocking the import makes bernhard fall back to bernhard.wire.
+        with FakeRiemannServer() as server:
+            self.assertEqual(run(
+                'import sys\n'
+                'sys.modules["google.protobuf"] = None\n'
+                'import bernhard\n'
+                'c = bernhard.Client(port=int(sys.argv[1]))\n'
+                'print(bernhard.HAS_PROTOBUF, c.send({"host": "h"}))',
+                server.port), 'False True')
+            self.assertEqual(server.events[0].host, 'h')
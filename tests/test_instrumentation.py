@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -
+
+import socket
+import unittest
+
+import bernhard
+from bernhard.testing import FakeRiemannServer
+
+
+class InstrumentationTest(unittest.TestCase):
+    def test_histogram_buckets(self):
+        inst = bernhard.Instrumentation()
+        inst.observe('x', 0.5e-6)
+        inst.observe('x', 3e-6)
+        inst.observe('x', 100.0)
+        histogram = inst.snapshot()['histograms']['x']
+        self.assertEqual(histogram['count'], 3)
+        self.assertAlmostEqual(histogram['sum'], 100.0000035)
+        self.assertEqual(histogram['buckets'],
+                         {1e-6: 1, 4e-6: 1, float('inf'): 1})
+
+    def test_client_round_trip(self):
+        inst = bernhard.Instrumentation()
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port, instrumentation=inst)
+            client.send({'host': 'a'})
+            client.send({'host': 'b'})
+            client.disconnect()
+        snapshot = inst.snapshot()
+        counters = snapshot['counters']
+        self.assertEqual(counters['connects'], 1)
+        self.assertEqual(counters['frames_sent'], 2)
+        self.assertEqual(counters['frames_received'], 2)
+        self.assertTrue(counters['bytes_sent'] > 0)
+        for name in ('connect', 'serialize', 'send', 'read_header', 'read_body'):
+            self.assertTrue(snapshot['histograms'][name]['count'] >= 1, name)
+
+    def test_connect_errors(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        inst = bernhard.Instrumentation()
+        client = bernhard.Client(port=port, instrumentation=inst)
+        self.assertRaises(bernhard.TransportError, client.send, {'host': 'a'})
+        self.assertEqual(inst.snapshot()['counters']['connect_errors'], 1)
+
+    def test_subclass_receives_updates(self):
+        seen = []
+
+        class Recorder(bernhard.Instrumentation):
+            def count(self, name, n=1):
+                seen.append(name)
+
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port, instrumentation=Recorder())
+            client.send({'host': 'a'})
+            client.disconnect()
+        self.assertTrue('frames_sent' in seen)
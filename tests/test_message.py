@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -
+
+import unittest
+
+import bernhard
+from bernhard import wire
+
+
+class MessageTest(unittest.TestCase):
+    def test_ack_is_read_without_parsing(self):
+        response = bernhard.Message(raw=wire.encode_message(ok=True))
+        self.assertTrue(response.ok)
+        self.assertIsNone(response._message)
+
+    def test_events_are_parsed_lazily_and_cached(self):
+        raw = wire.encode_message([{'host': 'a'}, {'host': 'b'}])
+        response = bernhard.Message(raw=bytearray(raw))
+        self.assertIsNone(response._message)
+        events = response.events
+        self.assertIs(response.events, events)
+        self.assertIs(events[0], events[0])
+        self.assertEqual([e.host for e in events], ['a', 'b'])
+        self.assertEqual([e.host for e in events[::-1]], ['b', 'a'])
+        self.assertEqual(events[-1].host, 'b')
+
+    def test_project(self):
+        events = bernhard._build_message([
+            {'host': 'a', 'time': 10}, {'host': 'b', 'time': 20}]).events
+        self.assertEqual(events.project('host', 'time'),
+                         [('a', 10), ('b', 20)])
+        self.assertRaises(ValueError, events.project, 'nope')
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -
+
+import threading
+import time
+import unittest
+
+import bernhard
+from bernhard.testing import FakeRiemannServer
+
+
+def decode_hosts(raw):
+    return [event.host for event in bernhard.Message(raw=raw).events]
+
+
+def readers():
+    return len([thread for thread in threading.enumerate()
+                if thread.name == 'bernhard-pipeline-reader'])
+
+
+class PipelinedClientTest(unittest.TestCase):
+    def test_acks_are_matched_in_order(self):
+        # Each query's answer lists the events sent before it, so an ack
+        # handed to the wrong caller shows up as the wrong list.
+        with FakeRiemannServer(latency=0.01) as server:
+            client = bernhard.PipelinedClient(port=server.port)
+            expected = []
+            pending = []
+            for i in range(20):
+                client.send_nowait({'host': 'host-%d' % i})
+                expected.append('host-%d' % i)
+                pending.append((list(expected), client.submit(
+                    bernhard.Message(query='true'), decode=decode_hosts)))
+            for hosts, response in pending:
+                self.assertEqual(response.result(5.0), hosts)
+            self.assertTrue(client.flush(5.0))
+            self.assertEqual(client.stats()['acked'], 20)
+            self.assertEqual(client.stats()['in_flight'], 0)
+            client.disconnect()
+
+    def test_callbacks_run_in_submit_order(self):
+        with FakeRiemannServer(latency=0.01) as server:
+            client = bernhard.PipelinedClient(port=server.port)
+            order = []
+            responses = [client.submit(
+                bernhard._build_message([{'host': 'host-%d' % i}]),
+                callback=lambda pending, i=i: order.append(i))
+                for i in range(50)]
+            for response in responses:
+                response.result(5.0)
+            self.assertEqual(order, list(range(50)))
+            client.disconnect()
+
+    def test_send_async(self):
+        with FakeRiemannServer() as server:
+            client = bernhard.PipelinedClient(port=server.port)
+            self.assertTrue(client.send_async({'host': 'a'}).result(5.0))
+            client.disconnect()
+        with FakeRiemannServer(ok=False, error='rejected') as server:
+            client = bernhard.PipelinedClient(port=server.port)
+            self.assertFalse(client.send_async({'host': 'a'}).result(5.0))
+            client.disconnect()
+
+    def test_rejected_frames_are_queued_for_resend(self):
+        errors = []
+        with FakeRiemannServer(ok=False, error='rejected') as server:
+            client = bernhard.PipelinedClient(
+                port=server.port, resend_limit=10,
+                on_error=lambda message, error: errors.append(str(error)))
+            for i in range(3):
+                client.send_nowait({'host': 'host-%d' % i})
+            self.assertTrue(client.flush(5.0))
+            self.assertEqual(client.stats()['errors'], 3)
+            self.assertEqual(len(client.resend_queue), 3)
+            self.assertEqual(errors, ['rejected'] * 3)
+            client.disconnect()
+
+
+class ShutdownTest(unittest.TestCase):
+    def setUp(self):
+        # Exceptions that end a thread are otherwise only printed.
+        self.thread_errors = []
+        if hasattr(threading, 'excepthook'):
+            hook = threading.excepthook
+            threading.excepthook = lambda args: self.thread_errors.append(
+                '%s: %s' % (args.exc_type.__name__, args.exc_value))
+            self.addCleanup(setattr, threading, 'excepthook', hook)
+
+    def test_close_with_frames_in_flight(self):
+        with FakeRiemannServer(latency=0.01) as server:
+            for i in range(10):
+                transport = bernhard.PipelinedTCPTransport('127.0.0.1', server.port)
+                responses = [transport.submit(bernhard.wire.encode_message(
+                    [{'host': 'a'}])) for j in range(20)]
+                time.sleep(0.005 * (i % 3))
+                transport.close()
+                transport._reader.join(5.0)
+                self.assertFalse(transport._reader.is_alive())
+                for response in responses:
+                    self.assertTrue(response.done())
+        self.assertEqual(self.thread_errors, [])
+
+    def test_server_stops_under_load(self):
+        before = readers()
+        for i in range(10):
+            server = FakeRiemannServer().start()
+            client = bernhard.PipelinedClient(port=server.port, resend_limit=10000)
+            errors = []
+
+            def run():
+                try:
+                    for j in range(300):
+                        client.send_nowait({'host': 'a', 'metric': j})
+                except Exception as e:
+                    errors.append(repr(e))
+
+            threads = [threading.Thread(target=run) for j in range(4)]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.01)
+            server.stop()
+            for thread in threads:
+                thread.join()
+            self.assertTrue(client.flush(5.0))
+            self.assertEqual(errors, [])
+            # Every frame was either acked or reported failed, exactly once.
+            stats = client.stats()
+            self.assertEqual(stats['sent'], 1200)
+            self.assertEqual(stats['in_flight'], 0)
+            self.assertEqual(stats['resend_queue'], stats['errors'])
+            client.disconnect()
+        self.assertEqual(self.thread_errors, [])
+        # Readers left blocked on a socket closed under them would
+        # otherwise wait out the read timeout.
+        deadline = time.time() + 5.0
+        while readers() > before and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(readers() <= before)
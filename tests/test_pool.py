@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -
+
+import threading
+import unittest
+
+from bernhard import TransportError
+from bernhard.pool import ConnectionPool, PooledClient
+from bernhard.testing import FakeRiemannServer
+
+from tests.support import use_high_fds
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def test_checkin_reuses_connection(self):
+        pool = ConnectionPool(FakeConnection, max_size=2)
+        first = pool.checkout()
+        pool.checkin(first)
+        self.assertIs(pool.checkout(), first)
+        stats = pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_most_recently_used_first(self):
+        pool = ConnectionPool(FakeConnection, max_size=2)
+        first, second = pool.checkout(), pool.checkout()
+        pool.checkin(first)
+        pool.checkin(second)
+        self.assertIs(pool.checkout(), second)
+
+    def test_checkout_times_out_when_full(self):
+        pool = ConnectionPool(FakeConnection, max_size=1)
+        pool.checkout()
+        self.assertRaises(TransportError, pool.checkout, 0.01)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_checkout_waits_for_checkin(self):
+        pool = ConnectionPool(FakeConnection, max_size=1)
+        connection = pool.checkout()
+        timer = threading.Timer(0.05, pool.checkin, (connection,))
+        timer.start()
+        self.assertIs(pool.checkout(5.0), connection)
+        timer.join()
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_transport_error_discards_connection(self):
+        pool = ConnectionPool(FakeConnection, max_size=1)
+        try:
+            with pool.connection() as connection:
+                raise TransportError("broken")
+        except TransportError:
+            pass
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.checkout(), connection)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_idle_connections_are_evicted(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, max_idle_time=0)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.assertIsNot(pool.checkout(), connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['evicted'], 1)
+
+    def test_factory_error_frees_slot(self):
+        def factory():
+            raise TransportError("refused")
+        pool = ConnectionPool(factory, max_size=1)
+        self.assertRaises(TransportError, pool.checkout)
+        self.assertEqual(pool.stats()['size'], 0)
+
+
+class PooledClientTest(unittest.TestCase):
+    def test_threads_share_connections(self):
+        with FakeRiemannServer() as server:
+            client = PooledClient(port=server.port, max_size=2)
+
+            def run(i):
+                for j in range(20):
+                    client.send({'host': 'host-%d' % i, 'metric': j})
+
+            threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(server.received, 80)
+            self.assertTrue(server.connections <= 2)
+            client.disconnect()
+            self.assertEqual(client.pool.stats()['size'], 0)
+
+    def test_reuses_high_file_descriptors(self):
+        use_high_fds(self)
+        with FakeRiemannServer() as server:
+            client = PooledClient(port=server.port, max_size=1)
+            for i in range(5):
+                self.assertTrue(client.send({'host': 'a'}))
+            stats = client.pool.stats()
+            self.assertEqual(stats['created'], 1)
+            self.assertEqual(stats['unhealthy'], 0)
+            client.disconnect()
+
+    def test_reconnects_after_server_closes(self):
+        with FakeRiemannServer() as server:
+            client = PooledClient(port=server.port, max_size=1)
+            self.assertTrue(client.send({'host': 'a'}))
+        with FakeRiemannServer(port=server.port) as server:
+            self.assertTrue(client.send({'host': 'b'}))
+            self.assertEqual([e.host for e in client.query('true')], ['b'])
+            client.disconnect()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -
+
+import io
+import unittest
+
+import bernhard
+from bernhard import wire
+from bernhard.pool import PooledClient
+from bernhard.testing import FakeRiemannServer
+
+EVENTS = [{'host': 'host-%d' % i, 'description': 'x' * 50, 'metric': i}
+          for i in range(3000)]
+
+
+class QueryIterTest(unittest.TestCase):
+    def check_client(self, client, server):
+        client.send(*EVENTS)
+        hosts = [e.host for e in client.query_iter('true')]
+        self.assertEqual(hosts, [e['host'] for e in EVENTS])
+        # A query left unfinished drops its connection, and the next one
+        # reconnects.
+        results = client.query_iter('true')
+        self.assertEqual(next(results).host, 'host-0')
+        results.close()
+        self.assertEqual(len(list(client.query_iter('true'))), len(EVENTS))
+        client.disconnect()
+
+    def test_client(self):
+        with FakeRiemannServer() as server:
+            self.check_client(bernhard.Client(port=server.port), server)
+
+    def test_pooled_client(self):
+        with FakeRiemannServer() as server:
+            self.check_client(PooledClient(port=server.port, max_size=1), server)
+            self.assertEqual(server.connections, 2)
+
+    def test_pipelined_client(self):
+        with FakeRiemannServer() as server:
+            self.check_client(bernhard.PipelinedClient(port=server.port), server)
+
+    def test_small_frame_reader_buffer(self):
+        raw = wire.encode_message(EVENTS[:10])
+
+        class Sock(object):
+            def __init__(self):
+                self.data = io.BytesIO(raw)
+
+            def recv_into(self, view):
+                data = self.data.read(len(view))
+                view[:len(data)] = data
+                return len(data)
+
+        reader = bernhard.FrameReader(Sock(), len(raw), buffer_size=7)
+        fields = list(wire.iter_fields(reader.read, len(raw)))
+        self.assertEqual(len(fields), 10)
+        self.assertEqual(bernhard.pb.Event.FromString(fields[3][1]).host,
+                         'host-3')
+
+
+class VarintTest(unittest.TestCase):
+    def test_round_trip(self):
+        for value in (0, 1, 127, 128, 300, 2 ** 32, 2 ** 64 - 1):
+            data = wire.encode_varint(value)
+            self.assertEqual(len(data), wire.varint_size(value))
+            self.assertEqual(wire.read_varint(io.BytesIO(data).read),
+                             (value, len(data)))
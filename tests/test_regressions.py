@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -
+
+import shutil
+import tempfile
+import unittest
+
+import bernhard
+from bernhard import wire
+from bernhard.pool import PooledClient
+from bernhard.spool import Spool
+from bernhard.testing import FakeRiemannServer
+
+
+class ReceiveBufferTest(unittest.TestCase):
+    # TCPTransport reads every response into one reused buffer. Responses
+    # that outlive the next read must hold their own copy.
+    def check_response_survives_next_transmit(self, client, server):
+        client.send({'host': 'first'})
+        response = client.transmit(bernhard.Message(query='true'))
+        # The next answer has the same layout but different bytes, so a
+        # response still pointing into the buffer would read it instead.
+        server.reset()
+        client.send({'host': 'later'})
+        server.ok = False
+        client.transmit(bernhard.Message(query='true'))
+        self.assertTrue(response.ok)
+        self.assertEqual([e.host for e in response.events], ['first'])
+        client.disconnect()
+
+    def test_response_survives_next_transmit(self):
+        with FakeRiemannServer() as server:
+            self.check_response_survives_next_transmit(
+                bernhard.Client(port=server.port), server)
+
+    def test_pooled_response_survives_next_transmit(self):
+        with FakeRiemannServer() as server:
+            self.check_response_survives_next_transmit(
+                PooledClient(port=server.port, max_size=1), server)
+
+    def test_query_with_spooled_frames(self):
+        # The spool is replayed over the same connection once the query
+        # has been answered.
+        directory = tempfile.mkdtemp()
+        try:
+            with FakeRiemannServer() as server:
+                bernhard.Client(port=server.port).send({'host': 'sent'})
+                spool = Spool(directory)
+                spool.append(wire.encode_message([{'host': 'spooled'}]))
+                client = bernhard.Client(port=server.port, spool=spool)
+                self.assertEqual([e.host for e in client.query('true')],
+                                 ['sent'])
+                self.assertEqual(len(spool), 0)
+                self.assertEqual([e.host for e in client.query('true')],
+                                 ['sent', 'spooled'])
+                client.disconnect()
+                spool.close()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+class EventListTest(unittest.TestCase):
+    def test_negative_index_out_of_range(self):
+        events = bernhard._build_message([{'host': 'a'}, {'host': 'b'}]).events
+        self.assertEqual(events[-2].host, 'a')
+        self.assertRaises(IndexError, lambda: events[-3])
+        self.assertRaises(IndexError, lambda: events[2])
+
+
+class UDPClientTest(unittest.TestCase):
+    def test_send_reports_oversized_events(self):
+        with FakeRiemannServer(protocol='udp') as server:
+            client = bernhard.UDPClient(port=server.port, max_datagram_size=64)
+            self.assertFalse(client.send({'host': 'x' * 100}))
+            self.assertIsNone(client.connection)
+            self.assertFalse(client.send({'host': 'x' * 100}, {'host': 'a'}))
+            self.assertTrue(client.send({'host': 'a'}))
+            self.assertEqual(client.oversized, 2)
+            client.disconnect()
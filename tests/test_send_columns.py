@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -
+
+import unittest
+
+import bernhard
+from bernhard.testing import FakeRiemannServer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class SendColumnsTest(unittest.TestCase):
+    def test_columns_and_shared_values(self):
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port)
+            self.assertTrue(client.send_columns(
+                host='web1', service=['a', 'b', 'c'], metric=[1.0, 2.0, 3.0],
+                time=range(10, 13), tags=[['x'], [], ['y', 'z']],
+                attributes={'dc': 'east'}))
+            client.disconnect()
+        events = [bernhard.Event(event=e) for e in server.events]
+        self.assertEqual(server.frames, 1)
+        self.assertEqual([e.service for e in events], ['a', 'b', 'c'])
+        self.assertEqual([e.host for e in events], ['web1'] * 3)
+        self.assertEqual([e.time for e in events], [10, 11, 12])
+        self.assertEqual([list(e.tags) for e in events], [['x'], [], ['y', 'z']])
+        self.assertEqual([a.value for a in events[2].attributes], ['east'])
+
+    def test_split_into_frames(self):
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port)
+            self.assertTrue(client.send_columns(
+                max_frame_size=1000, host='h', service=['s'] * 500,
+                metric=list(range(500))))
+            client.disconnect()
+        self.assertTrue(server.frames > 1)
+        self.assertEqual(server.received, 500)
+
+    def test_mismatched_columns(self):
+        client = bernhard.Client(port=1)
+        self.assertRaises(ValueError, client.send_columns,
+                          service=['a', 'b'], metric=[1.0])
+        self.assertRaises(ValueError, client.send_columns, nope=[1])
+
+    @unittest.skipIf(numpy is None, "needs numpy")
+    def test_numpy_columns(self):
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port)
+            self.assertTrue(client.send_columns(
+                host='h', metric=numpy.arange(5, dtype='float64'),
+                time=numpy.arange(5, dtype='int64')))
+            client.disconnect()
+        self.assertEqual([e.time for e in server.events], list(range(5)))
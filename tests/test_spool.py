@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import bernhard
+from bernhard import wire
+from bernhard.spool import Spool
+from bernhard.testing import FakeRiemannServer
+
+
+def collect(batches):
+    # A replay write() that accepts every batch and keeps a copy.
+    def write(raw):
+        batches.append(bytes(raw))
+        return True
+    return write
+
+
+class SpoolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def spool(self, **kwargs):
+        kwargs.setdefault('replay_rate', 1e6)
+        kwargs.setdefault('replay_burst', 1000)
+        return Spool(self.directory, **kwargs)
+
+    def test_append_and_replay(self):
+        spool = self.spool()
+        frames = [('frame %d' % i).encode('utf-8') for i in range(5)]
+        for frame in frames:
+            self.assertTrue(spool.append(frame))
+        self.assertEqual(len(spool), 5)
+
+        written = []
+        self.assertEqual(spool.replay(collect(written)), 5)
+        self.assertEqual(written, [b''.join(frames)])
+        self.assertEqual(len(spool), 0)
+        self.assertEqual(spool.depth()['replayed'], 5)
+        spool.close()
+
+    def test_rejected_frames_are_dropped(self):
+        spool = self.spool()
+        spool.append(b'a')
+        spool.append(b'b')
+        self.assertEqual(spool.replay(lambda raw: False), 2)
+        self.assertEqual(len(spool), 0)
+        self.assertEqual(spool.depth()['rejected'], 2)
+        spool.close()
+
+    def test_reopen_resumes_at_cursor(self):
+        spool = self.spool(segment_size=32)
+        for i in range(10):
+            spool.append(('frame %d' % i).encode('utf-8'))
+        written = []
+        spool.replay(collect(written), limit=4)
+        spool.close()
+
+        spool = self.spool(segment_size=32)
+        self.assertEqual(len(spool), 6)
+        spool.replay(collect(written))
+        self.assertEqual(b''.join(written), b''.join(
+            ('frame %d' % i).encode('utf-8') for i in range(10)))
+        spool.close()
+
+    def test_batches_are_limited(self):
+        spool = self.spool(replay_batch_bytes=20)
+        for i in range(10):
+            spool.append(('frame %d' % i).encode('utf-8'))
+        written = []
+        self.assertEqual(spool.replay(collect(written)), 10)
+        self.assertEqual(written, [b'frame 0frame 1', b'frame 2frame 3',
+                                   b'frame 4frame 5', b'frame 6frame 7',
+                                   b'frame 8frame 9'])
+        spool.close()
+
+    def test_burst_limits_frames_per_replay(self):
+        spool = self.spool(replay_burst=3, replay_rate=0.001)
+        for i in range(5):
+            spool.append(b'x')
+        written = []
+        self.assertEqual(spool.replay(collect(written)), 3)
+        self.assertEqual(written, [b'xxx'])
+        self.assertEqual(len(spool), 2)
+        spool.close()
+
+    def test_reopen_truncates_partial_frame(self):
+        spool = self.spool()
+        spool.append(b'complete')
+        spool.close()
+        segment = [name for name in os.listdir(self.directory)
+                   if name.endswith('.spool')][0]
+        with open(os.path.join(self.directory, segment), 'ab') as f:
+            f.write(b'\x00\x00\x00\x10part')
+
+        spool = self.spool()
+        self.assertEqual(len(spool), 1)
+        written = []
+        spool.replay(collect(written))
+        self.assertEqual(written, [b'complete'])
+        spool.close()
+
+    def test_evicts_oldest_segments(self):
+        spool = self.spool(segment_size=16, max_bytes=48)
+        for i in range(10):
+            spool.append(('frame %d' % i).encode('utf-8'))
+        depth = spool.depth()
+        self.assertTrue(depth['bytes'] <= 48)
+        self.assertEqual(depth['evicted'] + len(spool), 10)
+        written = []
+        spool.replay(collect(written))
+        self.assertTrue(written[-1].endswith(b'frame 9'))
+        spool.close()
+
+
+class ClientSpoolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_spooled_events_are_replayed_in_one_frame(self):
+        spool = Spool(self.directory)
+        for i in range(50):
+            spool.append(wire.encode_message([{'host': 'spooled', 'metric': i}]))
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port, spool=spool)
+            self.assertTrue(client.send({'host': 'live'}))
+            self.assertEqual(server.frames, 2)
+            self.assertEqual(server.received, 51)
+            self.assertEqual([bernhard.Event(event=e).metric
+                              for e in server.events[1:]], list(range(50)))
+            self.assertEqual(len(spool), 0)
+            client.disconnect()
+        spool.close()
+
+    def test_undeliverable_events_are_spooled(self):
+        spool = Spool(self.directory)
+        with FakeRiemannServer() as server:
+            port = server.port
+        client = bernhard.Client(port=port, spool=spool, connect_timeout=1.0)
+        client.send({'host': 'a'})
+        self.assertEqual(len(spool), 1)
+        with FakeRiemannServer(port=port) as server:
+            self.assertTrue(client.send({'host': 'b'}))
+            self.assertEqual(sorted(e.host for e in server.events), ['a', 'b'])
+            client.disconnect()
+        spool.close()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -
+
+import unittest
+
+import bernhard
+from bernhard.testing import FakeRiemannServer
+
+
+class EventTemplateTest(unittest.TestCase):
+    def setUp(self):
+        self.template = bernhard.EventTemplate(
+            host='web1', service='cpu', tags=['prod'],
+            attributes={'dc': 'east'}, ttl=60)
+
+    def test_event_merges_fields(self):
+        event = self.template.event(metric=0.5, tags=['extra'], host='web2')
+        expected = bernhard.Event(params={
+            'host': 'web2', 'service': 'cpu', 'tags': ['prod', 'extra'],
+            'attributes': {'dc': 'east'}, 'ttl': 60, 'metric': 0.5}).event
+        self.assertEqual(event.event, expected)
+
+    def test_encode_without_fields(self):
+        self.assertEqual(self.template.encode(), self.template.raw)
+        self.assertEqual(self.template.proto,
+                         bernhard.pb.Event.FromString(self.template.raw))
+
+    def test_send_encoded(self):
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port)
+            self.assertTrue(client.send_encoded(
+                self.template.encode(metric=0.42, time=1400000000),
+                self.template.encode({'metric': 0.47}, time=1400000010)))
+            client.disconnect()
+        self.assertEqual(server.frames, 1)
+        events = [bernhard.Event(event=e) for e in server.events]
+        self.assertEqual([e.time for e in events], [1400000000, 1400000010])
+        self.assertEqual([e.host for e in events], ['web1', 'web1'])
+        self.assertAlmostEqual(events[1].metric, 0.47, places=6)
+        self.assertEqual(list(events[0].tags), ['prod'])
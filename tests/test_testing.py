@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -
+
+import time
+import unittest
+
+import bernhard
+from bernhard.testing import FakeRiemannServer
+
+
+class FakeRiemannServerTest(unittest.TestCase):
+    def test_records_events(self):
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port)
+            client.send({'host': 'a'}, {'host': 'b'})
+            self.assertEqual((server.frames, server.received), (1, 2))
+            self.assertEqual(server.connections, 1)
+            server.reset()
+            self.assertEqual(server.events, [])
+            client.disconnect()
+
+    def test_rejects(self):
+        with FakeRiemannServer(ok=False, error='nope') as server:
+            client = bernhard.Client(port=server.port)
+            response = client.transmit(bernhard._build_message([{'host': 'a'}]))
+            self.assertFalse(response.ok)
+            self.assertEqual(response.error, 'nope')
+            client.disconnect()
+
+    def test_latency(self):
+        with FakeRiemannServer(latency=0.05) as server:
+            client = bernhard.Client(port=server.port)
+            start = time.time()
+            client.send({'host': 'a'})
+            self.assertTrue(time.time() - start >= 0.05)
+            client.disconnect()
+
+    def test_without_acks(self):
+        with FakeRiemannServer(ack=False) as server:
+            transport = bernhard.TCPTransport('127.0.0.1', server.port,
+                                              read_timeout=0.05)
+            self.assertRaises(bernhard.TransportError, transport.write,
+                              bernhard.Message(query='true').raw)
+            transport.close()
+            self.assertEqual(server.frames, 1)
+
+    def test_unknown_protocol(self):
+        self.assertRaises(ValueError, FakeRiemannServer, protocol='sctp')
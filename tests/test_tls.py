@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -
+
+import os
+import ssl
+import unittest
+
+import bernhard
+from bernhard.pool import PooledClient
+from bernhard.testing import FakeRiemannServer
+
+# A self-signed certificate for riemann.test, which acts as its own CA.
+CERTS = os.path.join(os.path.dirname(__file__), 'certs')
+CERTFILE = os.path.join(CERTS, 'riemann.crt')
+KEYFILE = os.path.join(CERTS, 'riemann.key')
+
+
+def tls_server():
+    return FakeRiemannServer(protocol='tls', certfile=CERTFILE, keyfile=KEYFILE)
+
+
+class SSLContextTest(unittest.TestCase):
+    def test_system_cas_check_hostname(self):
+        context = bernhard.create_ssl_context()
+        self.assertTrue(context.check_hostname)
+        self.assertEqual(context.verify_mode, ssl.CERT_REQUIRED)
+
+    def test_private_ca(self):
+        self.assertFalse(bernhard.create_ssl_context(ca_certs=CERTFILE).check_hostname)
+        self.assertTrue(bernhard.create_ssl_context(
+            ca_certs=CERTFILE, check_hostname=True).check_hostname)
+
+    def test_hostname_check_needs_private_ca(self):
+        self.assertRaises(ValueError, bernhard.create_ssl_context,
+                          check_hostname=False)
+
+
+class SSLClientTest(unittest.TestCase):
+    def test_round_trip_with_private_ca(self):
+        with tls_server() as server:
+            client = bernhard.SSLClient(port=server.port, ca_certs=CERTFILE)
+            self.assertTrue(client.send({'host': 'a'}))
+            self.assertEqual([e.host for e in client.query('true')], ['a'])
+            client.disconnect()
+
+    def test_hostname_mismatch(self):
+        with tls_server() as server:
+            client = bernhard.SSLClient(port=server.port, ca_certs=CERTFILE,
+                                        check_hostname=True)
+            self.assertRaises(bernhard.TransportError, client.send, {'host': 'a'})
+
+    def test_untrusted_certificate(self):
+        # The self-signed certificate is not signed by any system CA.
+        with tls_server() as server:
+            client = bernhard.SSLClient(port=server.port)
+            self.assertRaises(bernhard.TransportError, client.send, {'host': 'a'})
+
+    def test_session_resumed_on_reconnect(self):
+        with tls_server() as server:
+            client = bernhard.SSLClient(port=server.port, ca_certs=CERTFILE)
+            client.send({'host': 'a'})
+            context = client.context
+            client.disconnect()
+            client.send({'host': 'b'})
+            self.assertIs(client.context, context)
+            self.assertTrue(client.connection.session_reused)
+            client.disconnect()
+
+    def test_pooled_connections_share_context(self):
+        with tls_server() as server:
+            client = PooledClient(port=server.port, transport=bernhard.SSLTransport,
+                                  ca_certs=CERTFILE, max_size=2)
+            first = client.pool.checkout()
+            first.write(bernhard.Message(query='true').raw)
+            second = client.pool.checkout()
+            self.assertIs(first.sock.context, second.sock.context)
+            self.assertTrue(second.session_reused)
+            client.pool.checkin(first)
+            client.pool.checkin(second)
+            client.disconnect()
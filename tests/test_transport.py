@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -
+
+import unittest
+
+import bernhard
+from bernhard.testing import FakeRiemannServer
+
+
+class TCPTransportTest(unittest.TestCase):
+    def test_response_larger_than_buffer(self):
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port)
+            client.send(*[{'host': 'host-%d' % i, 'description': 'x' * 100}
+                          for i in range(2000)])
+            client.send({'host': 'small'})
+            events = client.query('true')
+            self.assertEqual(len(events), 2001)
+            self.assertEqual(events[-1].host, 'small')
+            self.assertTrue(len(client.connection.buffer) >
+                            bernhard.TCPTransport.buffer_size)
+            # The next, smaller response is still read correctly.
+            self.assertTrue(client.send({'host': 'last'}))
+            client.disconnect()
+
+    def test_max_frame_size(self):
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port)
+            client.send(*[{'host': 'x' * 100} for i in range(100)])
+            client.connection.max_frame_size = 1000
+            self.assertRaises(bernhard.TransportError,
+                              client.connection.write,
+                              bernhard.Message(query='true').raw)
+            client.disconnect()
+
+    def test_write_returns_bytes(self):
+        with FakeRiemannServer() as server:
+            transport = bernhard.TCPTransport('127.0.0.1', server.port)
+            raw = transport.write(bernhard.Message(query='true').raw)
+            self.assertTrue(isinstance(raw, bytes))
+            transport.close()
+
+    def test_connection_closed_by_server(self):
+        server = FakeRiemannServer().start()
+        transport = bernhard.TCPTransport('127.0.0.1', server.port)
+        server.stop()
+        self.assertRaises(bernhard.TransportError, transport.write,
+                          bernhard.Message(query='true').raw)
+        transport.close()
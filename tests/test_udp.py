@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -
+
+import time
+import unittest
+
+import bernhard
+from bernhard.testing import FakeRiemannServer
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class UDPClientTest(unittest.TestCase):
+    def test_events_are_packed_into_datagrams(self):
+        events = [{'host': 'myhost', 'service': 'disk %d' % i, 'metric': i}
+                  for i in range(500)]
+        client = bernhard.UDPClient(max_datagram_size=1400)
+        datagrams = client.pack(*events)
+        self.assertTrue(1 < len(datagrams) < 50)
+        self.assertTrue(all(len(d) <= 1400 for d in datagrams))
+
+        with FakeRiemannServer(protocol='udp') as server:
+            client = bernhard.UDPClient(port=server.port, max_datagram_size=1400)
+            self.assertTrue(client.send(*events))
+            self.assertTrue(wait_for(lambda: server.received == 500))
+            self.assertEqual(server.frames, len(datagrams))
+            self.assertEqual([e.service for e in server.events],
+                             [e['service'] for e in events])
+            client.disconnect()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -
+
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+import bernhard
+from bernhard.relay import Forwarder, RelayClient
+from bernhard.testing import FakeRiemannServer
+
+from tests.support import use_high_fds
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@unittest.skipIf(not hasattr(socket, 'AF_UNIX'), "needs Unix sockets")
+class UnixTransportTest(unittest.TestCase):
+    def test_stream_round_trip(self):
+        with FakeRiemannServer(protocol='unix') as server:
+            client = bernhard.Client(server.path, transport=bernhard.UnixTransport)
+            self.assertTrue(client.send({'host': 'a'}))
+            self.assertEqual([e.host for e in client.query('true')], ['a'])
+            client.disconnect()
+
+    def test_datagram_round_trip(self):
+        with FakeRiemannServer(protocol='unix-dgram') as server:
+            client = bernhard.UDPClient(server.path, port=None,
+                                        transport=bernhard.UnixDatagramTransport)
+            self.assertTrue(client.send({'host': 'a'}, {'host': 'b'}))
+            self.assertTrue(wait_for(lambda: server.received == 2))
+            client.disconnect()
+
+    def test_missing_socket(self):
+        self.assertRaises(bernhard.TransportError, bernhard.UnixTransport,
+                          '/nonexistent/riemann.sock')
+
+
+@unittest.skipIf(not hasattr(socket, 'AF_UNIX'), "needs Unix sockets")
+class RelayTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'relay.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_forwards_batched_events(self):
+        with FakeRiemannServer() as server:
+            forwarder = Forwarder(self.path, bernhard.Client(port=server.port),
+                                  flush_interval=0.05).start()
+            clients = [RelayClient(self.path) for i in range(3)]
+            for i, client in enumerate(clients):
+                for j in range(10):
+                    self.assertTrue(client.send({'host': 'worker-%d' % i,
+                                                 'metric': j}))
+            self.assertTrue(wait_for(lambda: server.received == 30))
+            self.assertTrue(server.frames < 30)
+            stats = forwarder.stats()
+            self.assertEqual(stats['received'], 30)
+            self.assertEqual(stats['failed'], 0)
+            for client in clients:
+                client.disconnect()
+            forwarder.stop()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_forwarder_with_high_file_descriptors(self):
+        use_high_fds(self)
+        with FakeRiemannServer() as server:
+            forwarder = Forwarder(self.path, bernhard.Client(port=server.port),
+                                  flush_interval=0.01).start()
+            self.assertTrue(forwarder.sock.fileno() >= 1024)
+            client = RelayClient(self.path)
+            self.assertTrue(client.send({'host': 'a'}))
+            self.assertTrue(wait_for(lambda: server.received == 1))
+            client.disconnect()
+            forwarder.stop()
+
+    def test_send_without_forwarder(self):
+        client = RelayClient(self.path)
+        self.assertFalse(client.send({'host': 'a'}))
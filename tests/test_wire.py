@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -
+
+import random
+import unittest
+
+import bernhard
+from bernhard import wire
+from bernhard.testing import FakeRiemannServer
+
+
+def random_event(rng):
+    # Covers every Event field the encoder writes, including the edge cases
+    # of negative times and sint64 metrics, empty strings, and attributes of
+    # each value type.
+    params = {'host': 'host-%d' % rng.randint(0, 1000),
+              'service': u'svc é %d' % rng.randint(0, 50)}
+    if rng.random() < 0.5:
+        params['metric'] = rng.uniform(-1e6, 1e6)
+    if rng.random() < 0.3:
+        params['metric_d'] = rng.uniform(-1e12, 1e12)
+    if rng.random() < 0.3:
+        params['metric_sint64'] = rng.randint(-2 ** 63, 2 ** 63 - 1)
+    if rng.random() < 0.7:
+        params['time'] = rng.randint(-2 ** 40, 2 ** 40)
+    if rng.random() < 0.5:
+        params['state'] = rng.choice(['ok', 'warning', 'critical', ''])
+    if rng.random() < 0.3:
+        params['description'] = 'x' * rng.randint(0, 300)
+    if rng.random() < 0.5:
+        params['ttl'] = rng.uniform(0, 3600)
+    if rng.random() < 0.5:
+        params['tags'] = ['tag%d' % i for i in range(rng.randint(0, 5))]
+    if rng.random() < 0.5:
+        params['attributes'] = dict(('k%d' % i, rng.choice([i, 'v', b'b', 1.5]))
+                                    for i in range(rng.randint(0, 4)))
+    return params
+
+
+class WireEncoderTest(unittest.TestCase):
+    def test_matches_protobuf(self):
+        rng = random.Random(0)
+        for i in range(2000):
+            events = [random_event(rng) for j in range(rng.randint(1, 4))]
+            expected = bernhard._build_message(events).message.SerializeToString()
+            self.assertEqual(wire.encode_message(events), expected, events)
+
+    def test_query_matches_protobuf(self):
+        for q in ['true', u'service = "é"']:
+            expected = bernhard.Message(query=q).message.SerializeToString()
+            self.assertEqual(wire.encode_message(query=q), expected)
+
+    def test_decode_ack(self):
+        for ok, error in [(True, u''), (False, u'no'), (False, u'é')]:
+            msg = bernhard.pb.Msg(ok=ok)
+            if error:
+                msg.error = error
+            self.assertEqual(wire.decode_ack(msg.SerializeToString()),
+                             (ok, error))
+
+
+class WireClientTest(unittest.TestCase):
+    def test_client_encoder(self):
+        with FakeRiemannServer() as server:
+            client = bernhard.Client(port=server.port)
+            client.encoder = wire.encode_message
+            self.assertTrue(client.send({'host': 'a', 'metric': 1.5,
+                                         'tags': ['t']}))
+            client.disconnect()
+        event = bernhard.Event(event=server.events[0])
+        self.assertEqual((event.host, event.metric, list(event.tags)),
+                         ('a', 1.5, ['t']))
+
+    def test_encode_rows(self):
+        rows = [('a', 1.0), ('b', 2.0)]
+        expected = bernhard._build_message(
+            [{'host': host, 'metric': metric} for host, metric in rows]).raw
+        self.assertEqual(wire.frame_events(wire.encode_rows(('host', 'metric'), rows)),
+                         expected)